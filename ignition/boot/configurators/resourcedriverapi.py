@@ -8,7 +8,7 @@ from ignition.service.requestqueue import LifecycleRequestQueueCapability
 from ignition.service.resourcedriver import (ResourceDriverProperties, ResourceDriverApiCapability, ResourceDriverServiceCapability, 
                                         ResourceDriverHandlerCapability, LifecycleExecutionMonitoringCapability, LifecycleMessagingCapability, 
                                         DriverFilesManagerCapability, ResourceDriverApiService, ResourceDriverService, 
-                                        LifecycleExecutionMonitoringService, LifecycleMessagingService, DriverFilesManagerService)
+                                        LifecycleExecutionMonitoringService, LifecycleExecutionPollingLoop, LifecycleMessagingService, DriverFilesManagerService)
 from ignition.boot.configurators.utils import validate_no_service_with_capability_exists
 
 logger = logging.getLogger(__name__)
@@ -103,8 +103,13 @@ class ResourceDriverServicesConfigurator():
             logger.debug('Bootstrapping Resource Driver Lifecycle Monitoring Service')
             validate_no_service_with_capability_exists(service_register, LifecycleExecutionMonitoringCapability,
                                                        'Resource Driver Lifecycle Execution Monitoring Service', 'bootstrap.resource_driver.lifecycle_monitoring_service_enabled')
-            service_register.add_service(ServiceRegistration(LifecycleExecutionMonitoringService, job_queue_service=JobQueueCapability,
-                                                             lifecycle_messaging_service=LifecycleMessagingCapability, handler=ResourceDriverHandlerCapability))
+            resource_driver_config = configuration.property_groups.get_property_group(ResourceDriverProperties)
+            if resource_driver_config.lifecycle_monitor_polling_loop_enabled is True:
+                service_register.add_service(ServiceRegistration(LifecycleExecutionPollingLoop, lifecycle_messaging_service=LifecycleMessagingCapability,
+                                                                 handler=ResourceDriverHandlerCapability, resource_driver_config=ResourceDriverProperties))
+            else:
+                service_register.add_service(ServiceRegistration(LifecycleExecutionMonitoringService, job_queue_service=JobQueueCapability,
+                                                                 lifecycle_messaging_service=LifecycleMessagingCapability, handler=ResourceDriverHandlerCapability))
         else:
             logger.debug('Disabled: bootstrapped Resource Driver Lifecycle Monitoring Service')
 
@@ -1,6 +1,5 @@
 import logging
 from abc import ABC, abstractmethod
-import networkx as nx
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +36,9 @@ class ServiceRegister():
     REQUIRES_CAPABILITY_LABEL = 'requiresCapability'
 
     def __init__(self):
+        # networkx is slow to import and only needed once services are registered, so it is not imported with this module
+        # (which every Service and Capability subclass depends on)
+        import networkx as nx
         self.service_graph = nx.DiGraph()
 
     def add_service(self, service_registration):
@@ -77,6 +79,7 @@ class ServiceRegister():
         return service_node['provided']
 
     def order_services_by_requirements(self):
+        import networkx as nx
         req_graph = self.__build_requirements_graph(enforce_capability_offered=True)
         self.__check_for_cycles_in_req_graph(req_graph)
         # Order
@@ -220,6 +223,7 @@ class ServiceRegister():
         return capability_classes
 
     def __build_requirements_graph(self, enforce_capability_offered=False):
+        import networkx as nx
         req_graph = nx.DiGraph()
         # Add all Services to a new graph
         service_classes = self.__get_service_classes()
@@ -240,6 +244,7 @@ class ServiceRegister():
         return req_graph
 
     def __check_for_cycles_in_req_graph(self, req_graph):
+        import networkx as nx
         cycles = list(nx.simple_cycles(req_graph))
         if len(cycles) > 0:
             cyclic_dependencies_for_exception = []
@@ -44,6 +44,10 @@ class LoggingContext(threading.local):
     def get_all(self):
         # protect the dictionary from changes - use the setters to do this
         return frozendict(self.data)
+
+    def snapshot(self):
+        # a plain dict copy of the context, for passing it on to another thread or process (e.g. on a queued request)
+        return dict(self.data)
     
     def clear(self):
         self.data = {}
@@ -1,4 +1,5 @@
 import json
+import orjson
 import threading
 import _thread
 import logging
@@ -11,6 +12,10 @@ from signal import signal, SIGTERM
 
 logger = logging.getLogger(__name__)
 
+# Time the Kafka producer waits for further sends before dispatching a batch, when no linger_ms is configured.
+# Allows messages posted in quick succession (e.g. bursts of lifecycle requests) to share a produce request
+DEFAULT_PRODUCER_LINGER_MS = 5
+
 ############################
 # Config
 ############################
@@ -120,6 +125,10 @@ class PostalCapability(Capability):
     def post(self, envelope):
         pass
 
+    def post_many(self, envelopes):
+        for envelope in envelopes:
+            self.post(envelope)
+
 
 class MessagingCapability(Capability):
 
@@ -155,7 +164,10 @@ class Envelope():
 class Message():
 
     def __init__(self, content):
-        self.content = str.encode(content)
+        if isinstance(content, bytes):
+            self.content = content
+        else:
+            self.content = str.encode(content)
 
 
 class JsonContent():
@@ -166,7 +178,16 @@ class JsonContent():
         self.dict_val = dict_val
 
     def get(self):
-        return json.dumps(self.dict_val)
+        return self.get_bytes().decode()
+
+    def get_bytes(self):
+        # NaN and Infinity are written as null by orjson, rather than the non-standard NaN/Infinity tokens written by the json module
+        try:
+            return orjson.dumps(self.dict_val, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # orjson rejects a few values the json module accepts (e.g. integers beyond 64 bits, strings with lone surrogates), so fall back to the same compact format.
+            # Non-ASCII characters are escaped, as lone surrogates cannot be encoded as UTF-8
+            return json.dumps(self.dict_val, separators=(',', ':')).encode()
 
     @staticmethod
     def read(str_val):
@@ -194,6 +215,16 @@ class PostalService(Service, PostalCapability):
             logger.debug('Posting envelope to {0} with key: {1} and message: {2}'.format(envelope.address, key, envelope.message))
             self.delivery_service.deliver(envelope, key=key)
 
+    def post_many(self, envelopes):
+        if envelopes is None:
+            raise ValueError('A list of envelopes must be passed to post messages')
+        for envelope in envelopes:
+            if envelope is None:
+                raise ValueError('An envelope must be passed to post a message')
+        logger.debug('Posting %s envelopes', len(envelopes))
+        for envelope in envelopes:
+            self.delivery_service.deliver(envelope)
+
 class KafkaDeliveryService(Service, DeliveryCapability):
 
     def sigterm_handler(self, sig, frame):
@@ -217,6 +248,8 @@ class KafkaDeliveryService(Service, DeliveryCapability):
             config = {key:self.messaging_config.get(key, None) for key in KafkaProducer.DEFAULT_CONFIG if self.messaging_config.get(key, None) is not None}
             config['bootstrap_servers'] = self.bootstrap_servers
             config['client_id'] = 'ignition'
+            if 'linger_ms' not in config:
+                config['linger_ms'] = DEFAULT_PRODUCER_LINGER_MS
             self.producer = KafkaProducer(**config)
 
     def __close_producer(self):
@@ -203,7 +203,7 @@ class KafkaLifecycleRequestQueueHandler(KafkaRequestQueueHandler):
                 self.messaging_service.send_lifecycle_execution(LifecycleExecution(request_id, STATUS_FAILED, FailureDetails(FAILURE_CODE_INTERNAL_ERROR, msg), {}))
                 return
 
-            file_name = '{0}'.format(str(uuid.uuid4()))
+            file_name = uuid.uuid4().hex
             request_as_dict['driver_files'] = self.driver_files_manager.build_tree(file_name, request_as_dict['driver_files'])
             request_as_dict['resource_properties'] = PropValueMap(request_as_dict['resource_properties'])
             request_as_dict['system_properties'] = PropValueMap(request_as_dict['system_properties'])
@@ -17,10 +17,24 @@ import logging
 import os
 import zipfile
 import shutil
-import base64
+import hashlib
+import time
+import threading
+import heapq
+import itertools
+import binascii
+import io
 import pathlib
+from frozendict import frozendict
 import ignition.openapi as openapi
 import connexion
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
 
 logger = logging.getLogger(__name__)
 # Grabs the __init__.py from the openapi package then takes it's parent, the openapi directory itself
@@ -52,6 +66,10 @@ class InvalidLifecycleNameError(ResourceDriverError):
     status_code = 400
 
 
+DEFAULT_MONITOR_CONCURRENCY = 10
+DEFAULT_MONITOR_POLL_INTERVAL = 5
+
+
 class ResourceDriverProperties(ConfigurationPropertiesGroup, Service, Capability):
 
     def __init__(self):
@@ -59,9 +77,24 @@ class ResourceDriverProperties(ConfigurationPropertiesGroup, Service, Capability
         self.api_spec = os.path.join(openapi_path, 'resource-driver.yaml')
         self.async_messaging_enabled = True
         self.scripts_workspace = './scripts_workspace'
+        # seconds an extracted driver files package is kept for re-use by requests with identical driver files (0 to disable)
+        self.driver_files_cache_ttl = 300
+        # total size (in bytes) of the extracted driver files kept in the cache, the least recently used packages not in use are removed once it is exceeded
+        self.driver_files_cache_max_size = 512 * 1024 * 1024
+        # monitor executions with a single in-process polling loop instead of round-tripping a job through the job queue on every check
+        self.lifecycle_monitor_polling_loop_enabled = False
+        # seconds between status checks of an execution monitored by the polling loop
+        self.lifecycle_monitor_poll_interval = DEFAULT_MONITOR_POLL_INTERVAL
+        # maximum number of get_lifecycle_execution calls the polling loop makes on the handler at a time
+        self.lifecycle_monitor_concurrency = DEFAULT_MONITOR_CONCURRENCY
         self.lifecycle_request_queue = LifecycleRequestQueueProperties()
 
 
+# topic configs shared by every LifecycleRequestQueueProperties, read-only so that no instance can change them for the others
+REQUEST_QUEUE_TOPIC_CONFIG = frozendict({'retention.ms': 60000, 'message.timestamp.difference.max.ms': 60000, 'file.delete.delay.ms': 60000})
+FAILED_REQUEST_QUEUE_TOPIC_CONFIG = frozendict({})
+
+
 class LifecycleRequestQueueProperties(ConfigurationProperties, Service, Capability):
     """
     Configuration related to the request queue
@@ -80,9 +113,9 @@ class LifecycleRequestQueueProperties(ConfigurationProperties, Service, Capabili
         self.enabled = False
         self.group_id = "request_queue_consumer"
         self.max_poll_interval_ms = MAX_POLL_INTERVAL
-        # name intentionally not set so that it can be constructed per-driver
-        self.topic = TopicConfigProperties(auto_create=True, num_partitions=20, config={'retention.ms': 60000, 'message.timestamp.difference.max.ms': 60000, 'file.delete.delay.ms': 60000})
-        self.failed_topic = TopicConfigProperties(auto_create=True, num_partitions=1, config={})
+        # name intentionally not set so that it can be constructed per-driver, which is why each instance has its own TopicConfigProperties
+        self.topic = TopicConfigProperties(auto_create=True, num_partitions=20, config=REQUEST_QUEUE_TOPIC_CONFIG)
+        self.failed_topic = TopicConfigProperties(auto_create=True, num_partitions=1, config=FAILED_REQUEST_QUEUE_TOPIC_CONFIG)
 
 
 class ResourceDriverHandlerCapability(Capability):
@@ -184,6 +217,10 @@ class LifecycleMessagingCapability(Capability):
     def send_lifecycle_execution(self, execution_task):
         pass
 
+    def send_lifecycle_executions(self, execution_tasks, **kwargs):
+        for execution_task in execution_tasks:
+            self.send_lifecycle_execution(execution_task, **kwargs)
+
 
 class ResourceDriverApiService(Service, ResourceDriverApiCapability, BaseController):
     """
@@ -199,12 +236,9 @@ class ResourceDriverApiService(Service, ResourceDriverApiCapability, BaseControl
         try:
             logging_context.set_from_headers()
 
-            tenant_id=None
-            if('tenantId' in connexion.request.headers):
-                tenant_id = connexion.request.headers['tenantId']
+            tenant_id = connexion.request.headers.get('tenantId')
+            if tenant_id is not None:
                 logger.debug("tenantId received in headers : %s", tenant_id)
-
-            logger.debug("Value of tenantId is %s", tenant_id)
             body = self.get_body(kwarg)
             logger.debug('Handling lifecycle execution request with body %s', body)
             lifecycle_name = self.get_body_required_field(body, 'lifecycleName')
@@ -282,13 +316,14 @@ class ResourceDriverService(Service, ResourceDriverServiceCapability):
                 'associated_topology': associated_topology,
                 'deployment_location': deployment_location,
                 'tenant_id': tenant_id,
-                'logging_context': dict(logging_context.get_all())
+                'logging_context': logging_context.snapshot()
             })
             execute_response = LifecycleExecuteResponse(request_id)
         else:
-            file_name = '{0}'.format(str(uuid.uuid4()))
+            file_name = uuid.uuid4().hex
             driver_files_tree = self.driver_files_manager.build_tree(file_name, driver_files)
-            associated_topology = AssociatedTopology.from_dict(associated_topology)
+            if not isinstance(associated_topology, AssociatedTopology):
+                associated_topology = AssociatedTopology.from_dict(associated_topology) if associated_topology else AssociatedTopology()
             execute_response = self.handler.execute_lifecycle(lifecycle_name, driver_files_tree, PropValueMap(system_properties), PropValueMap(resource_properties), PropValueMap(request_properties), associated_topology, deployment_location)
             if self.async_enabled is True:
                 self.__async_lifecycle_execution_completion(execute_response.request_id, deployment_location, tenant_id)
@@ -299,7 +334,7 @@ class ResourceDriverService(Service, ResourceDriverServiceCapability):
         return execute_response
 
     def find_reference(self, instance_name, driver_files, deployment_location):
-        file_name = '{0}'.format(str(uuid.uuid4()))
+        file_name = uuid.uuid4().hex
         driver_files_tree = self.driver_files_manager.build_tree(file_name, driver_files)
         find_response = self.handler.find_reference(instance_name, driver_files_tree, deployment_location)
         return find_response
@@ -314,53 +349,77 @@ LIFECYCLE_EXECUTION_MONITOR_JOB_TYPE = 'LifecycleExecutionMonitoring'
 class LifecycleExecutionMonitoringService(Service, LifecycleExecutionMonitoringCapability):
 
     def __init__(self, **kwargs):
-        if 'job_queue_service' not in kwargs:
-            raise ValueError('job_queue_service argument not provided')
         if 'lifecycle_messaging_service' not in kwargs:
             raise ValueError('lifecycle_messaging_service argument not provided')
         if 'handler' not in kwargs:
             raise ValueError('handler argument not provided')
-        self.job_queue_service = kwargs.get('job_queue_service')
         self.lifecycle_messaging_service = kwargs.get('lifecycle_messaging_service')
         self.handler = kwargs.get('handler')
+        self._attach_job_queue(**kwargs)
+
+    def _attach_job_queue(self, **kwargs):
+        if 'job_queue_service' not in kwargs:
+            raise ValueError('job_queue_service argument not provided')
+        self.job_queue_service = kwargs.get('job_queue_service')
         self.job_queue_service.register_job_handler(LIFECYCLE_EXECUTION_MONITOR_JOB_TYPE, self.job_handler)
 
     def job_handler(self, job_definition):
-        if 'request_id' not in job_definition or job_definition['request_id'] is None:
-            logger.warning('Job with {0} job type is missing request_id. This job has been discarded'.format(LIFECYCLE_EXECUTION_MONITOR_JOB_TYPE))
-            return True
-        if 'deployment_location' not in job_definition or job_definition['deployment_location'] is None:
-            logger.warning('Job with {0} job type is missing deployment_location. This job has been discarded'.format(LIFECYCLE_EXECUTION_MONITOR_JOB_TYPE))
+        if not self._is_valid_job(job_definition):
             return True
-        request_id = job_definition['request_id']
-        deployment_location = job_definition['deployment_location']
-        tenant_id = job_definition['tenant_id']
+        tenant_id = job_definition.get('tenant_id')
         try:
-            lifecycle_execution_task = self.handler.get_lifecycle_execution(request_id, deployment_location)
-        except RequestNotFoundError as e:
-            logger.debug('Request with ID {0} not found, the request will no longer be monitored'.format(request_id))
-            return True
-        except TemporaryResourceDriverError as e:
-            logger.exception('Temporary error occurred checking status of request with ID {0}. The job will be re-queued: {1}'.format(request_id, str(e)))
-            return False
+            lifecycle_execution_task = self.handler.get_lifecycle_execution(job_definition['request_id'], job_definition['deployment_location'])
         except Exception as e:
-            logger.exception('Unexpected error occurred checking status of request with ID {0}. A failure response will be posted and the job will NOT be re-queued: {1}'.format(request_id, str(e)))
-            lifecycle_execution_task = LifecycleExecution(request_id, STATUS_FAILED, FailureDetails(FAILURE_CODE_INTERNAL_ERROR, str(e)))
-            self.lifecycle_messaging_service.send_lifecycle_execution(lifecycle_execution_task, tenant_id=tenant_id)
-            return True
-        status = lifecycle_execution_task.status
-        if status in [STATUS_COMPLETE, STATUS_FAILED]:
+            finished, failed_execution_task = self._handle_lifecycle_execution_error(job_definition, e)
+            if failed_execution_task is not None:
+                self.lifecycle_messaging_service.send_lifecycle_execution(failed_execution_task, tenant_id=tenant_id)
+            return finished
+        if self._is_finished(lifecycle_execution_task):
             self.lifecycle_messaging_service.send_lifecycle_execution(lifecycle_execution_task, tenant_id=tenant_id)
-            if hasattr(self.handler, 'post_lifecycle_response'):
-                try:
-                    logger.debug(f'Calling post_lifecycle_response for request with ID: {0}'.format(request_id))
-                    self.handler.post_lifecycle_response(request_id, deployment_location)
-                except Exception as e:
-                    logger.exception('Unexpected error occurred on post_lifecycle_response for request with ID {0}. This error has no impact on the response: {1}'.format(request_id, str(e)))
+            self._post_lifecycle_response(job_definition)
             return True
         return False
 
-    def __create_job_definition(self, request_id, deployment_location, tenant_id):
+    def _is_valid_job(self, job_definition):
+        if 'request_id' not in job_definition or job_definition['request_id'] is None:
+            logger.warning('Job with %s job type is missing request_id. This job has been discarded', LIFECYCLE_EXECUTION_MONITOR_JOB_TYPE)
+            return False
+        if 'deployment_location' not in job_definition or job_definition['deployment_location'] is None:
+            logger.warning('Job with %s job type is missing deployment_location. This job has been discarded', LIFECYCLE_EXECUTION_MONITOR_JOB_TYPE)
+            return False
+        return True
+
+    def _is_finished(self, lifecycle_execution_task):
+        return lifecycle_execution_task.status in [STATUS_COMPLETE, STATUS_FAILED]
+
+    def _handle_lifecycle_execution_error(self, job_definition, e):
+        """
+        Returns a tuple of (finished, failed lifecycle execution to be sent or None)
+        """
+        request_id = job_definition['request_id']
+        if isinstance(e, RequestNotFoundError):
+            logger.debug('Request with ID %s not found, the request will no longer be monitored', request_id)
+            return True, None
+        if isinstance(e, TemporaryResourceDriverError):
+            logger.exception('Temporary error occurred checking status of request with ID %s. The job will be re-queued: %s', request_id, e)
+            return False, None
+        logger.exception('Unexpected error occurred checking status of request with ID %s. A failure response will be posted and the job will NOT be re-queued: %s', request_id, e)
+        return True, LifecycleExecution(request_id, STATUS_FAILED, FailureDetails(FAILURE_CODE_INTERNAL_ERROR, str(e)))
+
+    def _post_lifecycle_response(self, job_definition):
+        request_id = job_definition['request_id']
+        if hasattr(self.handler, 'post_lifecycle_response'):
+            try:
+                logger.debug('Calling post_lifecycle_response for request with ID: %s', request_id)
+                self.handler.post_lifecycle_response(request_id, job_definition['deployment_location'])
+            except Exception as e:
+                logger.exception('Unexpected error occurred on post_lifecycle_response for request with ID %s. This error has no impact on the response: %s', request_id, e)
+
+    def _create_job_definition(self, request_id, deployment_location, tenant_id):
+        if request_id is None:
+            raise ValueError('Cannot monitor task when request_id is not given')
+        if deployment_location is None:
+            raise ValueError('Cannot monitor task when deployment_location is not given')
         return {
             'job_type': LIFECYCLE_EXECUTION_MONITOR_JOB_TYPE,
             'request_id': request_id,
@@ -369,11 +428,120 @@ class LifecycleExecutionMonitoringService(Service, LifecycleExecutionMonitoringC
         }
 
     def monitor_execution(self, request_id, deployment_location, tenant_id):
-        if request_id is None:
-            raise ValueError('Cannot monitor task when request_id is not given')
-        if deployment_location is None:
-            raise ValueError('Cannot monitor task when deployment_location is not given')
-        self.job_queue_service.queue_job(self.__create_job_definition(request_id, deployment_location, tenant_id))
+        self.job_queue_service.queue_job(self._create_job_definition(request_id, deployment_location, tenant_id))
+
+
+class LifecycleExecutionPollingLoop(LifecycleExecutionMonitoringService):
+    """
+    Alternative to the LifecycleExecutionMonitoringService which keeps monitored executions in memory, rather than on the job queue.
+    A single daemon thread wakes when the earliest check is due, checks every due execution with batch_job_handler and schedules those not finished for another check after poll_interval seconds.
+
+    As nothing is written to the job queue, executions being monitored are not picked up by another driver instance if this one is stopped
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if 'resource_driver_config' not in kwargs:
+            raise ValueError('resource_driver_config argument not provided')
+        resource_driver_config = kwargs.get('resource_driver_config')
+        self.poll_interval = resource_driver_config.lifecycle_monitor_poll_interval
+        self.monitor_concurrency = resource_driver_config.lifecycle_monitor_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=self.monitor_concurrency, thread_name_prefix='LifecycleExecutionMonitor')
+        # heap of (due time, sequence, job definition), the sequence keeps jobs due at the same time in the order they were scheduled
+        self._scheduled_jobs = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self.__run, name='LifecycleExecutionPollingLoop', daemon=True)
+        self._thread.start()
+
+    def _attach_job_queue(self, **kwargs):
+        # monitored executions are kept in memory, so nothing is registered with the job queue
+        pass
+
+    def batch_job_handler(self, job_definitions):
+        """
+        Check the status of several monitoring jobs at once, calling get_lifecycle_execution on the handler concurrently (at most monitor_concurrency calls at a time).
+        Finished executions are sent with one send_lifecycle_executions call per tenant
+
+        :param list job_definitions: monitoring jobs, as created by monitor_execution
+        :return: list of booleans, in the same order as job_definitions, indicating if each job has finished (False means the job should be checked again later)
+        """
+        finished = [True] * len(job_definitions)
+        futures = {}
+        for idx, job_definition in enumerate(job_definitions):
+            if self._is_valid_job(job_definition):
+                future = self._executor.submit(self.handler.get_lifecycle_execution, job_definition['request_id'], job_definition['deployment_location'])
+                futures[future] = idx
+        executions_to_send = {}
+        finished_jobs = {}
+        for future in as_completed(futures):
+            idx = futures[future]
+            job_definition = job_definitions[idx]
+            tenant_id = job_definition.get('tenant_id')
+            try:
+                lifecycle_execution_task = future.result()
+            except Exception as e:
+                finished[idx], failed_execution_task = self._handle_lifecycle_execution_error(job_definition, e)
+                if failed_execution_task is not None:
+                    executions_to_send.setdefault(tenant_id, []).append(failed_execution_task)
+            else:
+                finished[idx] = self._is_finished(lifecycle_execution_task)
+                if finished[idx]:
+                    executions_to_send.setdefault(tenant_id, []).append(lifecycle_execution_task)
+                    finished_jobs.setdefault(tenant_id, []).append(job_definition)
+        for tenant_id, lifecycle_execution_tasks in executions_to_send.items():
+            try:
+                self.lifecycle_messaging_service.send_lifecycle_executions(lifecycle_execution_tasks, tenant_id=tenant_id)
+            except Exception as e:
+                # as with a job handler error on the job queue, the jobs are dropped rather than checked (and sent) again
+                logger.exception('Unexpected error occurred sending %s lifecycle execution(s) for tenant %s. The requests will no longer be monitored: %s', len(lifecycle_execution_tasks), tenant_id, e)
+                continue
+            for job_definition in finished_jobs.get(tenant_id, []):
+                self._post_lifecycle_response(job_definition)
+        return finished
+
+    def monitor_execution(self, request_id, deployment_location, tenant_id):
+        self.__schedule([self._create_job_definition(request_id, deployment_location, tenant_id)], time.monotonic())
+
+    def _stop(self):
+        # the loop runs on a daemon thread for the life of the process, this is only needed to stop it (and its executor) within a process, such as in tests
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def __schedule(self, job_definitions, due_time):
+        with self._condition:
+            for job_definition in job_definitions:
+                heapq.heappush(self._scheduled_jobs, (due_time, next(self._sequence), job_definition))
+            self._condition.notify()
+
+    def __take_due_jobs(self):
+        with self._condition:
+            while not self._stopped:
+                now = time.monotonic()
+                if len(self._scheduled_jobs) > 0 and self._scheduled_jobs[0][0] <= now:
+                    due_jobs = []
+                    while len(self._scheduled_jobs) > 0 and self._scheduled_jobs[0][0] <= now:
+                        due_jobs.append(heapq.heappop(self._scheduled_jobs)[2])
+                    return due_jobs
+                timeout = self._scheduled_jobs[0][0] - now if len(self._scheduled_jobs) > 0 else None
+                self._condition.wait(timeout=timeout)
+            return None
+
+    def __run(self):
+        while True:
+            due_jobs = self.__take_due_jobs()
+            if due_jobs is None:
+                return
+            try:
+                finished = self.batch_job_handler(due_jobs)
+            except Exception as e:
+                logger.exception('Unexpected error occurred checking status of %s monitored request(s), they will be checked again: %s', len(due_jobs), e)
+                finished = [False] * len(due_jobs)
+            self.__schedule([job_definition for job_definition, job_finished in zip(due_jobs, finished) if not job_finished], time.monotonic() + self.poll_interval)
 
 
 class LifecycleMessagingService(Service, LifecycleMessagingCapability):
@@ -392,14 +560,60 @@ class LifecycleMessagingService(Service, LifecycleMessagingCapability):
             raise ValueError('lifecycle_execution_events topic name must be set')
 
     def send_lifecycle_execution(self, lifecycle_execution, **kwargs):
-        tenant_id=None
-        if 'tenant_id' in kwargs:
-            tenant_id = kwargs['tenant_id'] 
+        self.postal_service.post(self.__build_envelope(lifecycle_execution, kwargs.get('tenant_id')))
+
+    def send_lifecycle_executions(self, lifecycle_executions, **kwargs):
+        """
+        Send several lifecycle execution events (for the same tenant) in a single call to the postal service
+        """
+        tenant_id = kwargs.get('tenant_id')
+        envelopes = [self.__build_envelope(lifecycle_execution, tenant_id) for lifecycle_execution in lifecycle_executions]
+        self.postal_service.post_many(envelopes)
+
+    def __build_envelope(self, lifecycle_execution, tenant_id):
         if lifecycle_execution is None:
             raise ValueError('lifecycle_execution must be set to send an lifecycle execution event')
         lifecycle_execution_message_content = lifecycle_execution_dict(lifecycle_execution)
-        message_str = JsonContent(lifecycle_execution_message_content).get()
-        self.postal_service.post(Envelope(self.lifecycle_execution_events_topic, Message(message_str), tenant_id=tenant_id))
+        message_content = JsonContent(lifecycle_execution_message_content).get_bytes()
+        return Envelope(self.lifecycle_execution_events_topic, Message(message_content), tenant_id=tenant_id)
+
+DRIVER_FILES_EXTRACT_CONCURRENCY = 8
+# packages are only extracted concurrently when they are large enough for it to pay off (on a host with more than one CPU), smaller ones are extracted in sequence
+DRIVER_FILES_CONCURRENT_EXTRACT_MIN_SIZE = 16 * 1024 * 1024
+DRIVER_FILES_CONCURRENT_EXTRACT_MIN_MEMBERS = 1000
+DRIVER_FILES_CACHE_DIR = '.driver_files_cache'
+DRIVER_FILES_CACHE_LOCK_SUFFIX = '.lock'
+
+
+def _try_lock_file(lock_file):
+    """
+    Try to take an exclusive lock on an open file, without waiting. The lock is released when the file is closed, including when the process holding it stops
+
+    :return: True if the lock was taken, False if it is held by another open of the file (in this or any other process)
+    """
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class CachedDriverFiles():
+    """
+    A driver files package extracted once into the cache directory, copied for each request with identical driver files
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.extracted = Future()
+        self.users = 0
+        self.last_used = time.monotonic()
+        self.size = 0
+
 
 class DriverFilesManagerService(Service, DriverFilesManagerCapability):
 
@@ -410,45 +624,222 @@ class DriverFilesManagerService(Service, DriverFilesManagerCapability):
         self.scripts_workspace = resource_driver_config.scripts_workspace
         if self.scripts_workspace is None:
             raise ValueError('scripts_workspace directory must be set')
+        self.cache_ttl = resource_driver_config.driver_files_cache_ttl
+        self.cache_max_size = resource_driver_config.driver_files_cache_max_size
+        # each service has its own cache directory, kept alongside a lock file held for the life of the service.
+        # Other services (in any process sharing the scripts_workspace) only remove a cache directory once they can take its lock, so never one still in use
+        self.cache_path = os.path.join(self.scripts_workspace, '{0}.{1}'.format(DRIVER_FILES_CACHE_DIR, uuid.uuid4().hex))
+        self.cache_lock_path = self.cache_path + DRIVER_FILES_CACHE_LOCK_SUFFIX
+        self._cache_lock_file = None
         self.__create_workspace_if_needed()
+        if self.cache_ttl:
+            self.__lock_cache()
+        self._extract_executor = None
+        if (os.cpu_count() or 1) > 1:
+            self._extract_executor = ThreadPoolExecutor(max_workers=DRIVER_FILES_EXTRACT_CONCURRENCY, thread_name_prefix='DriverFilesExtract')
+        self._cached_driver_files = {}
+        self._cached_driver_files_lock = threading.Lock()
+        self._eviction_timer = None
 
     def __create_workspace_if_needed(self):
-        if not os.path.exists(self.scripts_workspace):
-            os.makedirs(self.scripts_workspace)
+        os.makedirs(self.scripts_workspace, exist_ok=True)
+        self.__remove_stale_cache_dirs()
+
+    def __lock_cache(self):
+        self._cache_lock_file = open(self.cache_lock_path, 'a+')
+        if not _try_lock_file(self._cache_lock_file):
+            raise ResourceDriverError('Could not lock driver files cache at {0}'.format(self.cache_lock_path))
+
+    def __remove_stale_cache_dirs(self):
+        # the cache directories of services that are no longer running are removed, found by their lock files no longer being held
+        for name in os.listdir(self.scripts_workspace):
+            if not name.startswith(DRIVER_FILES_CACHE_DIR + '.') or not name.endswith(DRIVER_FILES_CACHE_LOCK_SUFFIX):
+                continue
+            lock_path = os.path.join(self.scripts_workspace, name)
+            try:
+                lock_file = open(lock_path, 'a+')
+            except OSError:
+                # removed by another service in the meantime
+                continue
+            if not _try_lock_file(lock_file):
+                lock_file.close()
+                continue
+            path = lock_path[:-len(DRIVER_FILES_CACHE_LOCK_SUFFIX)]
+            logger.debug('Removing driver files cache directory %s left by a stopped service', path)
+            threading.Thread(target=self.__remove_stale_cache_dir, args=(path, lock_path, lock_file), daemon=True).start()
+
+    def __remove_stale_cache_dir(self, path, lock_path, lock_file):
+        # the lock file is only removed once the directory has gone, so a directory left part removed is found again by the next service to start
+        try:
+            shutil.rmtree(path, ignore_errors=True)
+        finally:
+            lock_file.close()
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
 
     def build_tree(self, tree_name, lifecycle_scripts):
-        self.__clear_existing_files(tree_name)
-        package_path = self.__write_scripts_to_disk(tree_name, lifecycle_scripts)
-        extracted_path = self.__extract_scripts(tree_name, package_path)
+        extracted_path = self.__determine_extracted_path(tree_name)
+        if self.cache_ttl:
+            build_func = lambda path: self.__clone_cached_driver_files(lifecycle_scripts, path)
+        else:
+            build_func = lambda path: self.__extract_scripts(self.__decode_scripts(lifecycle_scripts), path)
+        if not os.path.exists(extracted_path):
+            build_func(extracted_path)
+        else:
+            self.__replace_existing_tree(build_func, extracted_path)
         return DirectoryTree(extracted_path)
 
-    def __clear_existing_files(self, tree_name):
-        package_write_path = self.__determine_package_path(tree_name)
-        if os.path.exists(package_write_path):
-            os.remove(package_write_path)
-        extracted_path = self.__determine_extracted_path(tree_name)
-        if os.path.exists(extracted_path):
-            shutil.rmtree(extracted_path)
+    def __replace_existing_tree(self, build_func, extracted_path):
+        # build alongside the existing tree then swap it in, so the old files can be removed in the background rather than before extracting
+        new_path = '{0}.new.{1}'.format(extracted_path, uuid.uuid4().hex)
+        old_path = '{0}.old.{1}'.format(extracted_path, uuid.uuid4().hex)
+        try:
+            build_func(new_path)
+        except Exception:
+            shutil.rmtree(new_path, ignore_errors=True)
+            raise
+        os.rename(extracted_path, old_path)
+        os.rename(new_path, extracted_path)
+        self.__remove_in_background(old_path)
+
+    def __remove_in_background(self, path):
+        threading.Thread(target=shutil.rmtree, args=(path,), kwargs={'ignore_errors': True}, daemon=True).start()
+
+    def __clone_cached_driver_files(self, lifecycle_scripts, path):
+        key = hashlib.sha256(lifecycle_scripts.encode('utf-8') if isinstance(lifecycle_scripts, str) else lifecycle_scripts).hexdigest()
+        with self._cached_driver_files_lock:
+            self.__evict_expired_driver_files()
+            cached_driver_files = self._cached_driver_files.get(key, None)
+            extract_needed = cached_driver_files is None
+            if extract_needed:
+                # each extract gets its own directory, so one being removed in the background after eviction can never remove a newer extract
+                cached_driver_files = CachedDriverFiles(os.path.join(self.cache_path, uuid.uuid4().hex))
+                self._cached_driver_files[key] = cached_driver_files
+            cached_driver_files.users += 1
+            cached_driver_files.last_used = time.monotonic()
+        try:
+            if extract_needed:
+                self.__extract_cached_driver_files(key, cached_driver_files, lifecycle_scripts)
+            else:
+                # an identical package is already extracted (or being extracted for another request), wait for it rather than extracting again
+                cached_driver_files.extracted.result()
+            try:
+                self.__clone_tree(cached_driver_files.path, path)
+            except OSError:
+                if os.path.isdir(cached_driver_files.path):
+                    raise
+                # the cached files were removed from outside this service, drop them so the next request extracts the package again
+                logger.warning('Cached driver files at %s are missing, extracting the driver files again', cached_driver_files.path)
+                with self._cached_driver_files_lock:
+                    if self._cached_driver_files.get(key, None) is cached_driver_files:
+                        del self._cached_driver_files[key]
+                shutil.rmtree(path, ignore_errors=True)
+                self.__extract_scripts(self.__decode_scripts(lifecycle_scripts), path)
+        finally:
+            with self._cached_driver_files_lock:
+                cached_driver_files.users -= 1
+                cached_driver_files.last_used = time.monotonic()
+                self.__schedule_eviction()
 
-    def __determine_package_path(self, tree_name):
-        package_write_path = os.path.join(self.scripts_workspace, '{0}.zip'.format(tree_name))
-        return package_write_path
+    def __extract_cached_driver_files(self, key, cached_driver_files, lifecycle_scripts):
+        try:
+            extracted_size = self.__extract_scripts(self.__decode_scripts(lifecycle_scripts), cached_driver_files.path)
+        except Exception as e:
+            with self._cached_driver_files_lock:
+                self._cached_driver_files.pop(key, None)
+            shutil.rmtree(cached_driver_files.path, ignore_errors=True)
+            cached_driver_files.extracted.set_exception(e)
+            raise
+        with self._cached_driver_files_lock:
+            cached_driver_files.size = extracted_size
+            self.__evict_driver_files_over_max_size()
+        cached_driver_files.extracted.set_result(cached_driver_files.path)
+
+    def __evict_expired_driver_files(self):
+        # must be called whilst holding _cached_driver_files_lock
+        now = time.monotonic()
+        for key, cached_driver_files in list(self._cached_driver_files.items()):
+            if cached_driver_files.users == 0 and cached_driver_files.extracted.done() and now - cached_driver_files.last_used >= self.cache_ttl:
+                del self._cached_driver_files[key]
+                self.__remove_in_background(cached_driver_files.path)
+
+    def __schedule_eviction(self):
+        # must be called whilst holding _cached_driver_files_lock
+        # the expired driver files are removed on a timer, so they do not stay on disk until the next request when traffic stops
+        if self._eviction_timer is not None:
+            return
+        idle_last_used = [cached_driver_files.last_used for cached_driver_files in self._cached_driver_files.values()
+                            if cached_driver_files.users == 0 and cached_driver_files.extracted.done()]
+        if len(idle_last_used) == 0:
+            return
+        delay = max(0, min(idle_last_used) + self.cache_ttl - time.monotonic())
+        self._eviction_timer = threading.Timer(delay, self.__evict_on_timer)
+        self._eviction_timer.daemon = True
+        self._eviction_timer.start()
+
+    def __evict_on_timer(self):
+        with self._cached_driver_files_lock:
+            self._eviction_timer = None
+            self.__evict_expired_driver_files()
+            self.__schedule_eviction()
+
+    def __evict_driver_files_over_max_size(self):
+        # must be called whilst holding _cached_driver_files_lock
+        total_size = sum(cached_driver_files.size for cached_driver_files in self._cached_driver_files.values())
+        if self.cache_max_size is None or total_size <= self.cache_max_size:
+            return
+        idle_driver_files = [(key, cached_driver_files) for key, cached_driver_files in self._cached_driver_files.items()
+                                if cached_driver_files.users == 0 and cached_driver_files.extracted.done()]
+        for key, cached_driver_files in sorted(idle_driver_files, key=lambda item: item[1].last_used):
+            if total_size <= self.cache_max_size:
+                break
+            del self._cached_driver_files[key]
+            total_size -= cached_driver_files.size
+            self.__remove_in_background(cached_driver_files.path)
+
+    def __clone_tree(self, source_path, target_path):
+        # copy, rather than link, each file so a driver changing the files in its tree never changes them for any other request
+        shutil.copytree(source_path, target_path)
 
     def __determine_extracted_path(self, tree_name):
-        extracted_path = os.path.join(self.scripts_workspace, tree_name)
-        return extracted_path
+        return os.path.join(self.scripts_workspace, tree_name)
 
-    def __write_scripts_to_disk(self, tree_name, lifecycle_scripts):
-        package_write_path = self.__determine_package_path(tree_name)
-        with open(package_write_path, 'wb') as package_writer:
-            package_writer.write(base64.b64decode(lifecycle_scripts))
-        return package_write_path
+    def __decode_scripts(self, lifecycle_scripts):
+        # the package is only needed long enough to extract it, so keep it in memory rather than writing it to the workspace.
+        # a2b_base64 decodes an ASCII str in place, where b64decode would first copy it to bytes
+        return io.BytesIO(binascii.a2b_base64(lifecycle_scripts))
 
-    def __extract_scripts(self, tree_name, package_path):
-        if not zipfile.is_zipfile(package_path):
+    def __extract_scripts(self, package, extracted_path):
+        try:
+            package_zip = zipfile.ZipFile(package, 'r')
+        except zipfile.BadZipFile:
             raise ValueError('lifecycle_scripts should include binary contents of a zip file')
-        extracted_path = self.__determine_extracted_path(tree_name)
-        with zipfile.ZipFile(package_path, 'r') as package_zip:
+        with package_zip:
+            return self.__extract_members(package_zip, extracted_path)
+
+    def __extract_members(self, package_zip, extracted_path):
+        members = package_zip.infolist()
+        extracted_size = sum(member.file_size for member in members)
+        if self._extract_executor is None or (extracted_size < DRIVER_FILES_CONCURRENT_EXTRACT_MIN_SIZE and len(members) < DRIVER_FILES_CONCURRENT_EXTRACT_MIN_MEMBERS):
             package_zip.extractall(extracted_path)
-        os.remove(package_path)
-        return extracted_path
+            return extracted_size
+        # Equivalent to package_zip.extractall(extracted_path) but files are extracted concurrently, so the decompression and writing of each can overlap.
+        # Directories, and the first file in each directory, are extracted up front so the workers never race to create the same parent directory
+        parent_dirs = set()
+        concurrent_members = []
+        for member in members:
+            parent_dir = os.path.dirname(member.filename)
+            if member.is_dir() or parent_dir not in parent_dirs:
+                parent_dirs.add(parent_dir)
+                package_zip.extract(member, extracted_path)
+            else:
+                concurrent_members.append(member)
+        futures = [self._extract_executor.submit(package_zip.extract, member, extracted_path) for member in concurrent_members]
+        # wait for every worker, even when one has failed, so none is still writing once the zip is closed or the extracted files are removed
+        wait(futures)
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+        return extracted_size
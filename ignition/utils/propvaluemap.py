@@ -11,14 +11,43 @@ A dictionary that holds property type and value for driver requests, with specia
 for key properties.
 """
 class PropValueMap(MutableMapping):
-    def __init__(self, values={}):
-        self.values = OrderedDict()
-        self.update(values)
+    def __init__(self, values=None):
+        if isinstance(values, dict):
+            # view over the source dict rather than a copy of it, entries are only validated here
+            # and any normalisation is done lazily on access
+            for value in values.values():
+                self.__validate(value)
+            self.values = values
+        else:
+            self.values = OrderedDict()
+            if values is not None:
+                self.update(values)
+
+    def __validate(self, value):
+        if isinstance(value, dict):
+            if value.get('type', None) is None:
+                raise ValueError("Value must have a type property")
+            if value['type'] == 'key':
+                if value.get('privateKey', None) is None:
+                    raise ValueError("Value must have a privateKey property")
+
+    def __normalise(self, value):
+        if isinstance(value, dict):
+            if 'value' not in value:
+                value['value'] = None
+            return value
+        # assume type == 'string'
+        return {
+            'value': value,
+            'type': 'string'
+        }
 
     def __getitem__(self, key):
         value_and_type = self.values[key]
         if value_and_type is None:
             return None
+        elif not isinstance(value_and_type, dict):
+            return value_and_type
         elif value_and_type['type'] == 'key':
             value = value_and_type['privateKey']
             public_key = value_and_type.get('publicKey', None)
@@ -26,29 +55,21 @@ class PropValueMap(MutableMapping):
                 value += '\n---\n' + public_key
             return value
         else:
-            return value_and_type['value']
+            return value_and_type.get('value', None)
 
     def __delitem__(self, key):
         del self.values[key]
 
     def __setitem__(self, key, value):
+        self.__validate(value)
         if isinstance(value, dict):
-            if value.get('type', None) is None:
-                raise ValueError("Value must have a type property")
-            if value['type'] == 'key':
-                if value.get('privateKey', None) is None:
-                    raise ValueError("Value must have a privateKey property")
             if 'value' not in value:
                 value['value'] = None
-            if key in self:
+            if key in self.values:
                 del self.values[key]
             self.values[key] = value
         else:
-            # assume type == 'string'
-            self.values[key] = {
-                'value': value,
-                'type': 'string'
-            }
+            self.values[key] = self.__normalise(value)
 
     def __iter__(self):
         return iter(self.values)
@@ -72,25 +93,34 @@ class PropValueMap(MutableMapping):
         return prop_value
 
     def get_value_and_type(self, key, default=None):
-        return self.values.get(key, default)
+        if key not in self.values:
+            return default
+        return self.__normalise(self.values[key])
 
     def items_with_types(self):
         return ValueAndTypeIterator(self)
 
     def to_dict(self):
-        return self.values
+        return {key: self.__normalise(value) for key, value in self.values.items()}
+
+    """
+    get a dictionary of all properties with their values resolved, for callers that need a realized copy
+    rather than this view
+    """
+    def get_all(self):
+        return {key: self[key] for key in self.values}
 
     """
     get properties, with "key" values obfuscated as "*****"
     """
     def get_props(self):
-        return PropValueMap(dict(map(self.obfuscate_value, self.values.items())))
+        return PropValueMap(dict(map(self.obfuscate_value, self.items_with_types())))
 
     """ 
     get key properties, complete with un-obfuscated value
     """
     def get_keys(self):
-        return PropValueMap({ prop_name: prop_value for prop_name, prop_value in self.values.items() if prop_value['type'] == 'key'})
+        return PropValueMap({ prop_name: prop_value for prop_name, prop_value in self.items_with_types() if prop_value['type'] == 'key'})
 
 class ValueAndTypeIterator:
     def __init__(self, propvaluemap):
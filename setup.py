@@ -29,7 +29,8 @@ setup(
         'frozendict==2.0.2',
         'Jinja2==3.0.1',
         'requests==2.25.0',
-        'click==8.0.1'
+        'click==8.0.1',
+        'orjson==3.8.0'
     ],
     entry_points='''
         [console_scripts]
@@ -2,7 +2,7 @@ from unittest.mock import patch, MagicMock
 from .utils import ConfiguratorTestCase
 from ignition.boot.config import BootstrapApplicationConfiguration, BootProperties
 from ignition.boot.configurators.resourcedriverapi import ResourceDriverApiConfigurator, ResourceDriverServicesConfigurator
-from ignition.service.resourcedriver import ResourceDriverProperties, ResourceDriverApiCapability, ResourceDriverServiceCapability, DriverFilesManagerCapability, ResourceDriverHandlerCapability, LifecycleExecutionMonitoringCapability, LifecycleMessagingCapability, ResourceDriverApiService, ResourceDriverService, DriverFilesManagerService, LifecycleExecutionMonitoringService, LifecycleMessagingService
+from ignition.service.resourcedriver import ResourceDriverProperties, ResourceDriverApiCapability, ResourceDriverServiceCapability, DriverFilesManagerCapability, ResourceDriverHandlerCapability, LifecycleExecutionMonitoringCapability, LifecycleMessagingCapability, ResourceDriverApiService, ResourceDriverService, DriverFilesManagerService, LifecycleExecutionMonitoringService, LifecycleExecutionPollingLoop, LifecycleMessagingService
 from ignition.service.messaging import TopicsProperties, PostalCapability, MessagingProperties
 from ignition.service.queue import JobQueueCapability
 from ignition.service.framework import Service, ServiceRegistration
@@ -158,6 +158,16 @@ class TestResourceDriverServicesConfigurator(ConfiguratorTestCase):
         self.assert_service_registration_equal(service_registrations[0], ServiceRegistration(LifecycleExecutionMonitoringService,
                                                                                              job_queue_service=JobQueueCapability, lifecycle_messaging_service=LifecycleMessagingCapability, handler=ResourceDriverHandlerCapability))
 
+    def test_configure_monitoring_with_polling_loop(self):
+        configuration = self.__bootstrap_config()
+        configuration.property_groups.get_property_group(BootProperties).resource_driver.lifecycle_monitoring_service_enabled = True
+        configuration.property_groups.get_property_group(ResourceDriverProperties).lifecycle_monitor_polling_loop_enabled = True
+        self.mock_service_register.get_service_offering_capability.return_value = None
+        ResourceDriverServicesConfigurator().configure(configuration, self.mock_service_register)
+        service_registrations = self.assert_services_registered(1)
+        self.assert_service_registration_equal(service_registrations[0], ServiceRegistration(LifecycleExecutionPollingLoop,
+                                                                                             lifecycle_messaging_service=LifecycleMessagingCapability, handler=ResourceDriverHandlerCapability, resource_driver_config=ResourceDriverProperties))
+
     def test_configure_monitoring_fails_when_already_registered(self):
         configuration = self.__bootstrap_config()
         configuration.property_groups.get_property_group(BootProperties).resource_driver.lifecycle_monitoring_service_enabled = True
@@ -45,7 +45,7 @@ class TestLifecycleRequestQueueService(unittest.TestCase):
         envelope_arg = args[0]
         self.assertIsInstance(envelope_arg, Envelope)
         self.assertEqual(envelope_arg.address, topic)
-        self.assertEqual(envelope_arg.message.content, json.dumps(request).encode())
+        self.assertEqual(envelope_arg.message.content, json.dumps(request, separators=(',', ':')).encode())
 
     def assert_request_failed_not_posted(self, request_as_dict):
         request = Request.from_str_message(json.dumps(request_as_dict), self.resource_driver_config.lifecycle_request_queue.failed_topic.name, 0, 0)
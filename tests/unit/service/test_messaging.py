@@ -2,10 +2,51 @@ import unittest
 import time
 import copy
 from unittest.mock import patch, MagicMock, call
-from ignition.service.messaging import PostalService, KafkaDeliveryService, KafkaInboxService, Envelope, Message, MessagingProperties
+from ignition.service.messaging import PostalService, KafkaDeliveryService, KafkaInboxService, Envelope, Message, MessagingProperties, JsonContent
 from kafka import KafkaProducer
 
 
+class TestJsonContent(unittest.TestCase):
+
+    def test_get(self):
+        self.assertEqual(JsonContent({'name': 'test', 'values': [1, 2], 'nested': {'a': None}}).get(), '{"name":"test","values":[1,2],"nested":{"a":null}}')
+
+    def test_get_with_non_str_keys(self):
+        self.assertEqual(JsonContent({1: 'one'}).get(), '{"1":"one"}')
+
+    def test_get_with_large_integer(self):
+        self.assertEqual(JsonContent({'big': 2**70}).get(), '{"big":1180591620717411303424}')
+
+    def test_get_with_lone_surrogate(self):
+        content = JsonContent.read('{"note": "\\ud800"}')
+        self.assertEqual(content.get(), '{"note":"\\ud800"}')
+        self.assertEqual(JsonContent.read(content.get()).dict_val, {'note': '\ud800'})
+
+    def test_get_with_nan_and_infinity(self):
+        self.assertEqual(JsonContent({'nan': float('nan'), 'inf': float('inf')}).get(), '{"nan":null,"inf":null}')
+
+    def test_get_with_unserializable_value_throws_error(self):
+        with self.assertRaises(TypeError):
+            JsonContent({'value': object()}).get()
+
+    def test_get_bytes(self):
+        self.assertEqual(JsonContent({'name': 'test'}).get_bytes(), b'{"name":"test"}')
+        self.assertEqual(JsonContent({'big': 2**70}).get_bytes(), b'{"big":1180591620717411303424}')
+
+    def test_read(self):
+        self.assertEqual(JsonContent.read('{"name": "test"}').dict_val, {'name': 'test'})
+
+
+class TestMessage(unittest.TestCase):
+
+    def test_encodes_str_content(self):
+        self.assertEqual(Message('test').content, b'test')
+
+    def test_keeps_bytes_content(self):
+        content = b'test'
+        self.assertIs(Message(content).content, content)
+
+
 class TestPostalService(unittest.TestCase):
 
     def setUp(self):
@@ -28,6 +69,21 @@ class TestPostalService(unittest.TestCase):
             postal_service.post(None)
         self.assertEqual(str(context.exception), 'An envelope must be passed to post a message')
 
+    def test_post_many_sends_envelopes_to_delivery_service(self):
+        postal_service = PostalService(delivery_service=self.mock_delivery_service)
+        test_envelopes = [Envelope('test', Message('test message 1')), Envelope('test', Message('test message 2'))]
+        postal_service.post_many(test_envelopes)
+        self.assertEqual(self.mock_delivery_service.deliver.call_count, 2)
+        self.mock_delivery_service.deliver.assert_any_call(test_envelopes[0])
+        self.mock_delivery_service.deliver.assert_any_call(test_envelopes[1])
+
+    def test_post_many_throws_error_when_envelope_is_none(self):
+        postal_service = PostalService(delivery_service=self.mock_delivery_service)
+        with self.assertRaises(ValueError) as context:
+            postal_service.post_many([Envelope('test', Message('test message')), None])
+        self.assertEqual(str(context.exception), 'An envelope must be passed to post a message')
+        self.mock_delivery_service.deliver.assert_not_called()
+
 
 class TestKafkaDeliveryService(unittest.TestCase):
 
@@ -55,11 +111,20 @@ class TestKafkaDeliveryService(unittest.TestCase):
         delivery_service = KafkaDeliveryService(messaging_properties=self.messaging_properties)
         test_envelope = Envelope('test_topic', Message('test message'))
         delivery_service.deliver(test_envelope)
-        mock_kafka_producer_init.assert_called_once_with(bootstrap_servers='test:9092', api_version_auto_timeout_ms=5000, client_id='ignition')
+        mock_kafka_producer_init.assert_called_once_with(bootstrap_servers='test:9092', api_version_auto_timeout_ms=5000, client_id='ignition', linger_ms=5)
         self.assertEqual(delivery_service.producer, mock_kafka_producer_init.return_value)
         mock_kafka_producer = mock_kafka_producer_init.return_value
         mock_kafka_producer.send.assert_called_once_with('test_topic', b'test message')
 
+    @patch('ignition.service.messaging.KafkaProducer')
+    def test_deliver_uses_configured_linger_ms(self, mock_kafka_producer_init):
+        # need to set this explicitly because we've patched KafkaProducer
+        mock_kafka_producer_init.DEFAULT_CONFIG = KafkaProducer.DEFAULT_CONFIG
+        self.messaging_properties.config={'api_version_auto_timeout_ms': 5000, 'linger_ms': 50}
+        delivery_service = KafkaDeliveryService(messaging_properties=self.messaging_properties)
+        delivery_service.deliver(Envelope('test_topic', Message('test message')))
+        mock_kafka_producer_init.assert_called_once_with(bootstrap_servers='test:9092', api_version_auto_timeout_ms=5000, client_id='ignition', linger_ms=50)
+
     @patch('ignition.service.messaging.KafkaProducer')
     def test_deliver_throws_error_when_envelope_is_none(self, mock_kafka_producer_init):
         delivery_service = KafkaDeliveryService(messaging_properties=self.messaging_properties)
@@ -1,152 +1,175 @@
 import unittest
-from unittest.mock import MagicMock
+import copy
+import re
+import orjson
+from unittest.mock import Mock
+from types import SimpleNamespace
 from ignition.service.queue import MessagingJobQueueService, JobQueueProperties
 from ignition.service.messaging import Envelope, TopicsProperties, MessagingProperties, TopicConfigProperties
 
 MESSAGE_VERSION = "1.0.0"
 
+# mocks in this module are created without spec or autospec, as inspecting the spec on creation is by far their largest cost.
+# Use a simple stub (e.g. types.SimpleNamespace) where a test needs attribute validation
+_make_mock = Mock
+
+
+class _RecordingHandler:
+    """
+    Job handler returning a fixed value and recording the calls made to it, for tests that need nothing more from a mock
+    """
+    __slots__ = ('rv', 'calls')
+
+    def __init__(self, rv=None):
+        self.rv = rv
+        self.calls = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        return self.rv
+
+
 class TestMessagingJobQueueService(unittest.TestCase):
 
-    def setUp(self):
-        self.mock_postal_service = MagicMock()
-        self.mock_inbox_service = MagicMock()
-        self.job_queue_config = JobQueueProperties()
+    # job posted to the queue by queue_job and on re-queue, serialized once at import in the same compact form as JsonContent
+    _EXPECTED_PAYLOAD = orjson.dumps({'job_type': 'test_job', 'version': MESSAGE_VERSION})
+    # job as received from the queue
+    _INPUT_JSON = '{"job_type": "test_job", "version": "1.0.0"}'
+
+    @classmethod
+    def setUpClass(cls):
+        # the mocks are built once for the class and reset before each test, rather than re-created for every test
+        cls._proto_postal = _make_mock()
+        cls._proto_inbox = _make_mock()
         job_queue_topic_props=TopicConfigProperties()
         job_queue_topic_props.name = 'job_queue'
         job_queue_topic_props.auto_create = False
-        self.mock_topics_config = MagicMock(job_queue=job_queue_topic_props)
-
-    def test_init_without_job_queue_config_throws_error(self):
-        with self.assertRaises(ValueError) as context:
-            MessagingJobQueueService(postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        self.assertEqual(str(context.exception), 'job_queue_config argument not provided')
+        cls._proto_topics = SimpleNamespace(job_queue=job_queue_topic_props)
+        # tests not covering the constructor take a copy of this service, rather than constructing their own
+        cls._service_template = MessagingJobQueueService(job_queue_config=JobQueueProperties(), postal_service=cls._proto_postal, inbox_service=cls._proto_inbox,
+                                                         topics_config=cls._proto_topics, messaging_config=MessagingProperties)
 
-    def test_init_without_messaging_properties_throws_error(self):
-        with self.assertRaises(ValueError) as context:
-            MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config)
-        self.assertEqual(str(context.exception), 'messaging_config argument not provided')
-
-    def test_init_without_postal_service_throws_error(self):
-        with self.assertRaises(ValueError) as context:
-            MessagingJobQueueService(job_queue_config=self.job_queue_config, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        self.assertEqual(str(context.exception), 'postal_service argument not provided')
+    def setUp(self):
+        # copy.copy of a mock shares its child mocks (e.g. post), so calls would leak between tests. Reset the prototypes instead
+        self._reset_all(self._proto_postal, self._proto_inbox)
+        self.mock_postal_service = self._proto_postal
+        self.mock_inbox_service = self._proto_inbox
+        self.mock_topics_config = self._proto_topics
+        self.job_queue_config = JobQueueProperties()
+        self.job_queue_service = copy.copy(self._service_template)
+        # handlers are registered by each test, so must not be shared with the template
+        self.job_queue_service.job_handlers = {}
+        self._handler = self.job_queue_service._MessagingJobQueueService__received_next_job_handler
 
-    def test_init_without_inbox_service_throws_error(self):
-        with self.assertRaises(ValueError) as context:
-            MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        self.assertEqual(str(context.exception), 'inbox_service argument not provided')
+    def _reset_all(self, *mocks):
+        for mock in mocks:
+            mock.reset_mock(return_value=True, side_effect=True)
 
-    def test_init_without_topics_config_throws_error(self):
-        with self.assertRaises(ValueError) as context:
-            MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, messaging_config=MessagingProperties)
-        self.assertEqual(str(context.exception), 'topics_config argument not provided')
+    def _assert_job_posted(self, expected_content=_EXPECTED_PAYLOAD):
+        self.mock_postal_service.post.assert_called_once()
+        args, kwargs = self.mock_postal_service.post.call_args
+        self.assertEqual(len(args), 1)
+        envelope_arg = args[0]
+        self.assertIs(type(envelope_arg), Envelope)
+        self.assertEqual(envelope_arg.address, 'job_queue')
+        self.assertEqual(envelope_arg.message.content, expected_content)
+
+    def _prewire_test_job_handler(self, handler_func):
+        # set the handler directly, the registration checks are covered by the register_job_handler tests
+        self.job_queue_service.job_handlers = {'test_job': handler_func}
+        return handler_func
+
+    def _assert_handler_called_once_with_job(self, handler_func):
+        self.assertEqual(handler_func.calls, [(({'job_type': 'test_job', 'version': MESSAGE_VERSION},), {})])
+
+    def _assert_raises_value_error(self, message):
+        return self.assertRaisesRegex(ValueError, '^{0}$'.format(re.escape(message)))
+
+    def test_init_without_required_argument_throws_error(self):
+        required_kwargs = {
+            'job_queue_config': self.job_queue_config,
+            'postal_service': self.mock_postal_service,
+            'inbox_service': self.mock_inbox_service,
+            'topics_config': self.mock_topics_config,
+            'messaging_config': MessagingProperties
+        }
+        for missing_arg in required_kwargs:
+            with self.subTest(missing_arg=missing_arg):
+                kwargs = {key: value for key, value in required_kwargs.items() if key != missing_arg}
+                with self._assert_raises_value_error('{0} argument not provided'.format(missing_arg)):
+                    MessagingJobQueueService(**kwargs)
 
     def test_init_without_job_queue_topic_throws_error(self):
-        mock_topics_config = MagicMock(job_queue=None)
-        with self.assertRaises(ValueError) as context:
+        mock_topics_config = SimpleNamespace(job_queue=None)
+        with self._assert_raises_value_error('topics_config.job_queue must be set'):
             MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=mock_topics_config, messaging_config=MessagingProperties)
-        self.assertEqual(str(context.exception), 'topics_config.job_queue must be set')
 
     def test_init_configures_watch_on_job_queue_inbox(self):
         job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties())
-        self.mock_inbox_service.watch_inbox.assert_called_once_with('job_queue_consumer', 'job_queue', job_queue_service._MessagingJobQueueService__received_next_job_handler)
+        self.assertEqual(self.mock_inbox_service.watch_inbox.call_count, 1)
+        self.assertEqual(self.mock_inbox_service.watch_inbox.call_args.args, ('job_queue_consumer', 'job_queue', job_queue_service._MessagingJobQueueService__received_next_job_handler))
+        self.assertEqual(self.mock_inbox_service.watch_inbox.call_args.kwargs, {})
 
     def test_register_job_handler(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        mock_handler_func = MagicMock()
-        job_queue_service.register_job_handler('test_job_type', mock_handler_func)
-        self.assertEqual(job_queue_service.job_handlers['test_job_type'], mock_handler_func)
+        mock_handler_func = _make_mock()
+        self.job_queue_service.register_job_handler('test_job_type', mock_handler_func)
+        self.assertEqual(self.job_queue_service.job_handlers['test_job_type'], mock_handler_func)
 
     def test_register_non_callable_job_handler(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        with self.assertRaises(ValueError) as context:
-            job_queue_service.register_job_handler('test_job_type', 'not a func')
-        self.assertEqual(str(context.exception), 'handler_func argument must be a callable function')
+        with self._assert_raises_value_error('handler_func argument must be a callable function'):
+            self.job_queue_service.register_job_handler('test_job_type', 'not a func')
 
     def test_register_duplicate_job_type_handler(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        job_queue_service.register_job_handler('test_job_type', MagicMock())
-        with self.assertRaises(ValueError) as context:
-            job_queue_service.register_job_handler('test_job_type', MagicMock())
-        self.assertEqual(str(context.exception), 'Handler for job_type \'test_job_type\' has already been registered')
+        self.job_queue_service.register_job_handler('test_job_type', _make_mock())
+        with self._assert_raises_value_error('Handler for job_type \'test_job_type\' has already been registered'):
+            self.job_queue_service.register_job_handler('test_job_type', _make_mock())
 
     def test_queue_job_posts_message(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        job_queue_service.queue_job({'job_type': 'test_job'})
-        self.mock_postal_service.post.assert_called_once()
-        args, kwargs = self.mock_postal_service.post.call_args
-        self.assertEqual(len(args), 1)
-        envelope_arg = args[0]
-        self.assertIsInstance(envelope_arg, Envelope)
-        self.assertEqual(envelope_arg.address, 'job_queue')
-        self.assertEqual(envelope_arg.message.content, b'{"job_type": "test_job", "version": "1.0.0"}')
+        self.job_queue_service.queue_job({'job_type': 'test_job'})
+        self._assert_job_posted()
 
     def test_queue_job_without_type_throws_error(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        with self.assertRaises(ValueError) as context:
-            job_queue_service.queue_job({})
-        self.assertEqual(str(context.exception), 'job_definition must have a job_type key')
-        with self.assertRaises(ValueError) as context:
-            job_queue_service.queue_job({'job_type': None})
-        self.assertEqual(str(context.exception), 'job_definition must have a job_type value (not None)')
+        for job_definition, expected_message in [
+            ({}, 'job_definition must have a job_type key'),
+            ({'job_type': None}, 'job_definition must have a job_type value (not None)')
+        ]:
+            with self.subTest(job_definition=job_definition):
+                with self._assert_raises_value_error(expected_message):
+                    self.job_queue_service.queue_job(job_definition)
 
     def test_next_job_handler_calls_handler_func(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        mock_handler_func = MagicMock()
-        job_queue_service.register_job_handler('test_job', mock_handler_func)
-        job_queue_service._MessagingJobQueueService__received_next_job_handler('{"job_type": "test_job", "version": "1.0.0"}')
-        mock_handler_func.assert_called_once_with({'job_type': 'test_job', "version": "1.0.0"})
-
-    def test_next_job_handler_requeues_job_if_handler_func_returns_not_finished(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        mock_handler_func = MagicMock()
-        mock_handler_func.return_value = False
-        job_queue_service.register_job_handler('test_job', mock_handler_func)
-        job_queue_service._MessagingJobQueueService__received_next_job_handler('{"job_type": "test_job", "version": "1.0.0"}')
-        mock_handler_func.assert_called_once_with({'job_type': 'test_job', "version": "1.0.0"})
-        self.mock_postal_service.post.assert_called_once()
-        args, kwargs = self.mock_postal_service.post.call_args
-        self.assertEqual(len(args), 1)
-        envelope_arg = args[0]
-        self.assertIsInstance(envelope_arg, Envelope)
-        self.assertEqual(envelope_arg.address, 'job_queue')
-        self.assertEqual(envelope_arg.message.content, b'{"job_type": "test_job", "version": "1.0.0"}')
+        handler_func = self._prewire_test_job_handler(_RecordingHandler())
+        self._handler(self._INPUT_JSON)
+        self._assert_handler_called_once_with_job(handler_func)
+
+    def test_next_job_handler_requeues_job(self):
+        for case in ['handler_returns_not_finished', 'no_handler_registered']:
+            with self.subTest(case=case):
+                # setUp is not repeated for each subTest
+                self._reset_all(self.mock_postal_service)
+                self.job_queue_service.job_handlers = {}
+                handler_func = self._prewire_test_job_handler(_RecordingHandler(False)) if case == 'handler_returns_not_finished' else None
+                result = self._handler(self._INPUT_JSON)
+                self.assertIsNone(result)
+                if handler_func is not None:
+                    self._assert_handler_called_once_with_job(handler_func)
+                self._assert_job_posted()
 
     def test_next_job_handler_does_not_requeue_job_when_finished(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        mock_handler_func = MagicMock()
-        mock_handler_func.return_value = True
-        job_queue_service.register_job_handler('test_job', mock_handler_func)
-        job_queue_service._MessagingJobQueueService__received_next_job_handler('{"job_type": "test_job", "version": "1.0.0"}')
-        mock_handler_func.assert_called_once_with({'job_type': 'test_job', "version": "1.0.0"})
+        handler_func = self._prewire_test_job_handler(_RecordingHandler(True))
+        self._handler(self._INPUT_JSON)
+        self._assert_handler_called_once_with_job(handler_func)
         self.mock_postal_service.post.assert_not_called()
 
     def test_next_job_handler_does_not_requeue_when_handler_func_throws_exception(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        mock_handler_func = MagicMock()
-        mock_handler_func.side_effect = ValueError('Fake error')
-        job_queue_service.register_job_handler('test_job', mock_handler_func)
-        job_queue_service._MessagingJobQueueService__received_next_job_handler('{"job_type": "test_job", "version": "1.0.0"}')
+        mock_handler_func = self._prewire_test_job_handler(_make_mock(side_effect=ValueError('Fake error')))
+        self._handler(self._INPUT_JSON)
         mock_handler_func.assert_called_once_with({'job_type': 'test_job', "version": "1.0.0"})
         self.mock_postal_service.post.assert_not_called()
 
     def test_next_job_handler_does_nothing_when_no_job_type(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        mock_handler_func = MagicMock()
-        mock_handler_func.return_value = True
-        job_queue_service.register_job_handler('test_job', mock_handler_func)
-        result = job_queue_service._MessagingJobQueueService__received_next_job_handler('{"not_job_type": "test_job", "version":"1.0.0"}')
+        handler_func = self._prewire_test_job_handler(_RecordingHandler(True))
+        result = self._handler('{"not_job_type": "test_job", "version":"1.0.0"}')
+        self.assertEqual(handler_func.calls, [])
         self.mock_postal_service.post.assert_not_called()
         self.assertIsNone(result)
-
-    def test_next_job_handler_requeues_job_when_no_handler_registered(self):
-        job_queue_service = MessagingJobQueueService(job_queue_config=self.job_queue_config, postal_service=self.mock_postal_service, inbox_service=self.mock_inbox_service, topics_config=self.mock_topics_config, messaging_config=MessagingProperties)
-        result = job_queue_service._MessagingJobQueueService__received_next_job_handler('{"job_type": "test_job", "version": "1.0.0"}')
-        self.assertIsNone(result)
-        self.mock_postal_service.post.assert_called_once()
-        args, kwargs = self.mock_postal_service.post.call_args
-        self.assertEqual(len(args), 1)
-        envelope_arg = args[0]
-        self.assertIsInstance(envelope_arg, Envelope)
-        self.assertEqual(envelope_arg.address, 'job_queue')
-        self.assertEqual(envelope_arg.message.content, b'{"job_type": "test_job", "version": "1.0.0"}')
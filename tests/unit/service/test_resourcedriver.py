@@ -1,8 +1,8 @@
 import unittest
 from unittest.mock import patch, MagicMock, ANY
 from ignition.api.exceptions import BadRequest
-from ignition.service.resourcedriver import (ResourceDriverApiService, ResourceDriverService, LifecycleExecutionMonitoringService, LifecycleMessagingService,
-                        DriverFilesManagerService, TemporaryResourceDriverError, RequestNotFoundError)
+from ignition.service.resourcedriver import (LifecycleRequestQueueProperties, ResourceDriverApiService, ResourceDriverService, LifecycleExecutionMonitoringService, LifecycleExecutionPollingLoop,
+                        LifecycleMessagingService, DriverFilesManagerService, TemporaryResourceDriverError, RequestNotFoundError, _try_lock_file)
 from ignition.model.lifecycle import LifecycleExecuteResponse, LifecycleExecution
 from ignition.model.references import FindReferenceResponse
 from ignition.model.failure import FailureDetails, FAILURE_CODE_INTERNAL_ERROR
@@ -13,9 +13,31 @@ import os
 import tempfile
 import shutil
 import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+import io
 from ignition.utils.propvaluemap import PropValueMap
 from flask import Flask
 
+class TestLifecycleRequestQueueProperties(unittest.TestCase):
+
+    def test_topic_configs_shared_but_topics_are_not(self):
+        properties_a = LifecycleRequestQueueProperties()
+        properties_b = LifecycleRequestQueueProperties()
+        self.assertIs(properties_a.topic.config, properties_b.topic.config)
+        self.assertEqual(properties_a.topic.config, {'retention.ms': 60000, 'message.timestamp.difference.max.ms': 60000, 'file.delete.delay.ms': 60000})
+        self.assertEqual(properties_a.failed_topic.config, {})
+        properties_a.topic.name = 'driver_a_requests'
+        self.assertIsNone(properties_b.topic.name)
+
+    def test_topic_configs_are_read_only(self):
+        properties = LifecycleRequestQueueProperties()
+        with self.assertRaises(TypeError):
+            properties.topic.config['retention.ms'] = 1
+        properties.read_from_dict({'topic': {'config': {'retention.ms': 1}}})
+        self.assertEqual(properties.topic.config, {'retention.ms': 1})
+        self.assertEqual(LifecycleRequestQueueProperties().topic.config['retention.ms'], 60000)
+
 class TestResourceDriverApiService(unittest.TestCase):
 
     def __props_with_types(self, orig_props):
@@ -377,6 +399,23 @@ class TestResourceDriverService(unittest.TestCase):
         mock_service_driver.execute_lifecycle.assert_called_once_with(lifecycle_name, mock_script_tree, self.__propvaluemap(system_properties), self.__propvaluemap(resource_properties), self.__propvaluemap(request_properties), AssociatedTopology.from_dict(associated_topology), deployment_location)
         self.assertEqual(result, execute_response)
 
+    def test_execute_passes_associated_topology_instance_to_driver_handler(self):
+        mock_service_driver = MagicMock()
+        mock_service_driver.execute_lifecycle.return_value = LifecycleExecuteResponse('123')
+        mock_resource_driver_config = MagicMock()
+        mock_resource_driver_config.lifecycle_request_queue.enabled = False
+        service = ResourceDriverService(handler=mock_service_driver, resource_driver_config=mock_resource_driver_config, driver_files_manager=MagicMock(),
+                                        lifecycle_messaging_service=MagicMock())
+        associated_topology = AssociatedTopology.from_dict({'Test': {'id': '123', 'type': 'TestType'}})
+        service.execute_lifecycle('start', b'123', {}, {}, {}, associated_topology, {'name': 'TestDl'}, '123456')
+        self.assertIs(mock_service_driver.execute_lifecycle.call_args[0][5], associated_topology)
+        for empty_associated_topology in [None, {}]:
+            with self.subTest(associated_topology=empty_associated_topology):
+                service.execute_lifecycle('start', b'123', {}, {}, {}, empty_associated_topology, {'name': 'TestDl'}, '123456')
+                handler_associated_topology = mock_service_driver.execute_lifecycle.call_args[0][5]
+                self.assertIsInstance(handler_associated_topology, AssociatedTopology)
+                self.assertEqual(handler_associated_topology.to_dict(), {})
+
     def test_execute_uses_file_manager(self):
         mock_service_driver = MagicMock()
         execute_response = LifecycleExecuteResponse('123')
@@ -588,6 +627,19 @@ class TestLifecycleExecutionMonitoringService(unittest.TestCase):
         self.mock_driver.get_lifecycle_execution.assert_called_once_with('req123', {'name': 'TestDl'})
         self.mock_lifecycle_messaging_service.send_lifecycle_execution.assert_called_once_with(self.mock_driver.get_lifecycle_execution.return_value, tenant_id='123456')
 
+    def test_job_handler_logs_request_id_when_posting_lifecycle_response(self):
+        self.mock_driver.get_lifecycle_execution.return_value = LifecycleExecution('req123', 'COMPLETE', None)
+        monitoring_service = LifecycleExecutionMonitoringService(job_queue_service=self.mock_job_queue, lifecycle_messaging_service=self.mock_lifecycle_messaging_service, handler=self.mock_driver)
+        with self.assertLogs('ignition.service.resourcedriver', level='DEBUG') as logs:
+            monitoring_service.job_handler({
+                'job_type': 'LifecycleExecutionMonitoring',
+                'request_id': 'req123',
+                'deployment_location': {'name': 'TestDl'},
+                'tenant_id': '123456'
+            })
+        self.assertIn('DEBUG:ignition.service.resourcedriver:Calling post_lifecycle_response for request with ID: req123', logs.output)
+        self.mock_driver.post_lifecycle_response.assert_called_once_with('req123', {'name': 'TestDl'})
+
     def test_job_handler_sends_message_when_task_failed(self):
         self.mock_driver.get_lifecycle_execution.return_value = LifecycleExecution('req123', 'FAILED', None)
         monitoring_service = LifecycleExecutionMonitoringService(job_queue_service=self.mock_job_queue, lifecycle_messaging_service=self.mock_lifecycle_messaging_service, handler=self.mock_driver)
@@ -621,6 +673,193 @@ class TestLifecycleExecutionMonitoringService(unittest.TestCase):
         self.mock_driver.get_lifecycle_execution.assert_not_called()
         self.mock_lifecycle_messaging_service.send_lifecycle_execution.assert_not_called()
 
+class TestLifecycleExecutionPollingLoop(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_lifecycle_messaging_service = MagicMock()
+        self.mock_driver = MagicMock()
+        self.mock_resource_driver_config = MagicMock(lifecycle_monitor_poll_interval=0.01, lifecycle_monitor_concurrency=10)
+        self.polling_loops = []
+
+    def tearDown(self):
+        for polling_loop in self.polling_loops:
+            polling_loop._stop()
+
+    def __build_polling_loop(self):
+        polling_loop = LifecycleExecutionPollingLoop(lifecycle_messaging_service=self.mock_lifecycle_messaging_service, handler=self.mock_driver,
+                                                     resource_driver_config=self.mock_resource_driver_config)
+        self.polling_loops.append(polling_loop)
+        return polling_loop
+
+    def __wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('Condition not met within {0} seconds'.format(timeout))
+            time.sleep(0.01)
+
+    def test_init_without_lifecycle_messaging_service_throws_error(self):
+        with self.assertRaises(ValueError) as context:
+            LifecycleExecutionPollingLoop(handler=self.mock_driver, resource_driver_config=self.mock_resource_driver_config)
+        self.assertEqual(str(context.exception), 'lifecycle_messaging_service argument not provided')
+
+    def test_init_without_driver_throws_error(self):
+        with self.assertRaises(ValueError) as context:
+            LifecycleExecutionPollingLoop(lifecycle_messaging_service=self.mock_lifecycle_messaging_service, resource_driver_config=self.mock_resource_driver_config)
+        self.assertEqual(str(context.exception), 'handler argument not provided')
+
+    def test_init_without_resource_driver_config_throws_error(self):
+        with self.assertRaises(ValueError) as context:
+            LifecycleExecutionPollingLoop(lifecycle_messaging_service=self.mock_lifecycle_messaging_service, handler=self.mock_driver)
+        self.assertEqual(str(context.exception), 'resource_driver_config argument not provided')
+
+    def test_init_uses_configured_concurrency(self):
+        self.mock_resource_driver_config.lifecycle_monitor_concurrency = 3
+        polling_loop = self.__build_polling_loop()
+        self.assertEqual(polling_loop.monitor_concurrency, 3)
+        self.assertEqual(polling_loop._executor._max_workers, 3)
+
+    def test_monitor_execution_throws_error_when_request_id_is_none(self):
+        polling_loop = self.__build_polling_loop()
+        with self.assertRaises(ValueError) as context:
+            polling_loop.monitor_execution(None, {'name': 'TestDl'}, '123456')
+        self.assertEqual(str(context.exception), 'Cannot monitor task when request_id is not given')
+
+    def test_monitor_execution_throws_error_when_deployment_location_is_none(self):
+        polling_loop = self.__build_polling_loop()
+        with self.assertRaises(ValueError) as context:
+            polling_loop.monitor_execution('req123', None, '123456')
+        self.assertEqual(str(context.exception), 'Cannot monitor task when deployment_location is not given')
+
+    def test_batch_job_handler_checks_all_jobs(self):
+        executions = {
+            'req1': LifecycleExecution('req1', 'IN_PROGRESS', None),
+            'req2': LifecycleExecution('req2', 'COMPLETE', None),
+            'req3': TemporaryResourceDriverError('Retry it'),
+            'req4': RequestNotFoundError('Not found')
+        }
+        def get_lifecycle_execution(request_id, deployment_location):
+            result = executions[request_id]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        self.mock_driver.get_lifecycle_execution.side_effect = get_lifecycle_execution
+        polling_loop = self.__build_polling_loop()
+        jobs = [{
+            'job_type': 'LifecycleExecutionMonitoring',
+            'request_id': request_id,
+            'deployment_location': {'name': 'TestDl'},
+            'tenant_id': '123456'
+        } for request_id in executions]
+        jobs.append({
+            'job_type': 'LifecycleExecutionMonitoring',
+            'deployment_location': {'name': 'TestDl'}
+        })
+        jobs_finished = polling_loop.batch_job_handler(jobs)
+        self.assertEqual(jobs_finished, [False, True, False, True, True])
+        self.assertEqual(self.mock_driver.get_lifecycle_execution.call_count, 4)
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_called_once_with([executions['req2']], tenant_id='123456')
+        self.mock_lifecycle_messaging_service.send_lifecycle_execution.assert_not_called()
+        self.mock_driver.post_lifecycle_response.assert_called_once_with('req2', {'name': 'TestDl'})
+
+    def test_batch_job_handler_sends_failure_on_unexpected_error(self):
+        self.mock_driver.get_lifecycle_execution.side_effect = ValueError('Unexpected')
+        polling_loop = self.__build_polling_loop()
+        jobs_finished = polling_loop.batch_job_handler([{
+            'job_type': 'LifecycleExecutionMonitoring',
+            'request_id': 'req123',
+            'deployment_location': {'name': 'TestDl'},
+            'tenant_id': '123456'
+        }])
+        self.assertEqual(jobs_finished, [True])
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_called_once_with(ANY, tenant_id='123456')
+        sent_executions = self.mock_lifecycle_messaging_service.send_lifecycle_executions.call_args[0][0]
+        self.assertEqual(len(sent_executions), 1)
+        sent_execution = sent_executions[0]
+        self.assertEqual(sent_execution.request_id, 'req123')
+        self.assertEqual(sent_execution.status, 'FAILED')
+        self.assertEqual(sent_execution.failure_details.failure_code, FAILURE_CODE_INTERNAL_ERROR)
+        self.mock_driver.post_lifecycle_response.assert_not_called()
+
+    def test_batch_job_handler_sends_executions_per_tenant(self):
+        executions = {
+            'req1': LifecycleExecution('req1', 'COMPLETE', None),
+            'req2': LifecycleExecution('req2', 'COMPLETE', None)
+        }
+        self.mock_driver.get_lifecycle_execution.side_effect = lambda request_id, deployment_location: executions[request_id]
+        polling_loop = self.__build_polling_loop()
+        jobs_finished = polling_loop.batch_job_handler([{
+            'job_type': 'LifecycleExecutionMonitoring',
+            'request_id': 'req1',
+            'deployment_location': {'name': 'TestDl'},
+            'tenant_id': 'tenant1'
+        }, {
+            'job_type': 'LifecycleExecutionMonitoring',
+            'request_id': 'req2',
+            'deployment_location': {'name': 'TestDl'},
+            'tenant_id': 'tenant2'
+        }])
+        self.assertEqual(jobs_finished, [True, True])
+        self.assertEqual(self.mock_lifecycle_messaging_service.send_lifecycle_executions.call_count, 2)
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_any_call([executions['req1']], tenant_id='tenant1')
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_any_call([executions['req2']], tenant_id='tenant2')
+
+    def test_send_error_for_one_tenant_does_not_resend_other_tenants(self):
+        executions = {
+            'req1': LifecycleExecution('req1', 'COMPLETE', None),
+            'req2': LifecycleExecution('req2', 'COMPLETE', None),
+            'req3': LifecycleExecution('req3', 'COMPLETE', None)
+        }
+        self.mock_driver.get_lifecycle_execution.side_effect = lambda request_id, deployment_location: executions[request_id]
+        def send_lifecycle_executions(lifecycle_executions, tenant_id=None):
+            if tenant_id == 'bad_tenant':
+                raise TypeError('Cannot serialize')
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.side_effect = send_lifecycle_executions
+        polling_loop = self.__build_polling_loop()
+        polling_loop.monitor_execution('req1', {'name': 'TestDl'}, 'bad_tenant')
+        polling_loop.monitor_execution('req2', {'name': 'TestDl'}, 'tenant2')
+        polling_loop.monitor_execution('req3', {'name': 'TestDl'}, 'tenant3')
+        self.__wait_for(lambda: self.mock_driver.post_lifecycle_response.call_count == 2)
+        time.sleep(0.1)
+        self.assertEqual(self.mock_driver.get_lifecycle_execution.call_count, 3)
+        self.assertEqual(self.mock_lifecycle_messaging_service.send_lifecycle_executions.call_count, 3)
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_any_call([executions['req1']], tenant_id='bad_tenant')
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_any_call([executions['req2']], tenant_id='tenant2')
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_any_call([executions['req3']], tenant_id='tenant3')
+        self.assertEqual(self.mock_driver.post_lifecycle_response.call_count, 2)
+        self.mock_driver.post_lifecycle_response.assert_any_call('req2', {'name': 'TestDl'})
+        self.mock_driver.post_lifecycle_response.assert_any_call('req3', {'name': 'TestDl'})
+
+    def test_sends_finished_execution(self):
+        lifecycle_execution = LifecycleExecution('req123', 'COMPLETE', None)
+        self.mock_driver.get_lifecycle_execution.return_value = lifecycle_execution
+        polling_loop = self.__build_polling_loop()
+        polling_loop.monitor_execution('req123', {'name': 'TestDl'}, '123456')
+        self.__wait_for(lambda: self.mock_lifecycle_messaging_service.send_lifecycle_executions.called)
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_called_once_with([lifecycle_execution], tenant_id='123456')
+        self.mock_driver.get_lifecycle_execution.assert_called_once_with('req123', {'name': 'TestDl'})
+        self.mock_driver.post_lifecycle_response.assert_called_once_with('req123', {'name': 'TestDl'})
+
+    def test_checks_unfinished_execution_again(self):
+        in_progress = LifecycleExecution('req123', 'IN_PROGRESS', None)
+        complete = LifecycleExecution('req123', 'COMPLETE', None)
+        self.mock_driver.get_lifecycle_execution.side_effect = [in_progress, TemporaryResourceDriverError('Retry'), complete]
+        polling_loop = self.__build_polling_loop()
+        polling_loop.monitor_execution('req123', {'name': 'TestDl'}, '123456')
+        self.__wait_for(lambda: self.mock_lifecycle_messaging_service.send_lifecycle_executions.called)
+        self.assertEqual(self.mock_driver.get_lifecycle_execution.call_count, 3)
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_called_once_with([complete], tenant_id='123456')
+
+    def test_stops_checking_when_request_not_found(self):
+        self.mock_driver.get_lifecycle_execution.side_effect = RequestNotFoundError('Not found')
+        polling_loop = self.__build_polling_loop()
+        polling_loop.monitor_execution('req123', {'name': 'TestDl'}, '123456')
+        self.__wait_for(lambda: self.mock_driver.get_lifecycle_execution.called)
+        time.sleep(0.1)
+        self.mock_driver.get_lifecycle_execution.assert_called_once()
+        self.mock_lifecycle_messaging_service.send_lifecycle_executions.assert_not_called()
+
+
 class TestLifecycleMessagingService(unittest.TestCase):
 
     def setUp(self):
@@ -660,7 +899,45 @@ class TestLifecycleMessagingService(unittest.TestCase):
         self.assertIsInstance(envelope_arg, Envelope)
         self.assertEqual(envelope_arg.address, self.mock_topics_configuration.lifecycle_execution_events.name)
         self.assertIsInstance(envelope_arg.message, Message)
-        self.assertEqual(envelope_arg.message.content, b'{"requestId": "req123", "status": "FAILED", "failureDetails": {"failureCode": "INTERNAL_ERROR", "description": "because it was meant to fail"}, "outputs": {}, "associatedTopology": {}, "version": "1.0.0"}')
+        self.assertEqual(envelope_arg.message.content, b'{"requestId":"req123","status":"FAILED","failureDetails":{"failureCode":"INTERNAL_ERROR","description":"because it was meant to fail"},"outputs":{},"associatedTopology":{},"version":"1.0.0"}')
+
+    def test_send_lifecycle_executions_posts_all_messages(self):
+        messaging_service = LifecycleMessagingService(postal_service=self.mock_postal_service, topics_configuration=self.mock_topics_configuration)
+        messaging_service.send_lifecycle_executions([LifecycleExecution('req1', 'COMPLETE', None), LifecycleExecution('req2', 'COMPLETE', None)], tenant_id='123456')
+        self.mock_postal_service.post_many.assert_called_once()
+        self.mock_postal_service.post.assert_not_called()
+        envelopes = self.mock_postal_service.post_many.call_args[0][0]
+        self.assertEqual(len(envelopes), 2)
+        for envelope, request_id in zip(envelopes, ['req1', 'req2']):
+            self.assertIsInstance(envelope, Envelope)
+            self.assertEqual(envelope.address, self.mock_topics_configuration.lifecycle_execution_events.name)
+            self.assertEqual(envelope.tenant_id, '123456')
+            self.assertEqual(envelope.message.content, '{{"requestId":"{0}","status":"COMPLETE","outputs":{{}},"associatedTopology":{{}},"version":"1.0.0"}}'.format(request_id).encode())
+
+    def test_send_lifecycle_execution_serializes_execution_changed_in_place(self):
+        messaging_service = LifecycleMessagingService(postal_service=self.mock_postal_service, topics_configuration=self.mock_topics_configuration)
+        lifecycle_execution = LifecycleExecution('req123', 'COMPLETE', None, outputs={})
+        messaging_service.send_lifecycle_execution(lifecycle_execution)
+        lifecycle_execution.outputs['a'] = '1'
+        messaging_service.send_lifecycle_execution(lifecycle_execution)
+        envelope_arg = self.mock_postal_service.post.call_args[0][0]
+        self.assertEqual(envelope_arg.message.content, b'{"requestId":"req123","status":"COMPLETE","outputs":{"a":"1"},"associatedTopology":{},"version":"1.0.0"}')
+
+    def test_send_lifecycle_execution_reserializes_changed_execution(self):
+        messaging_service = LifecycleMessagingService(postal_service=self.mock_postal_service, topics_configuration=self.mock_topics_configuration)
+        lifecycle_execution = LifecycleExecution('req123', 'IN_PROGRESS', None)
+        messaging_service.send_lifecycle_execution(lifecycle_execution)
+        lifecycle_execution.status = 'COMPLETE'
+        messaging_service.send_lifecycle_execution(lifecycle_execution)
+        envelope_arg = self.mock_postal_service.post.call_args[0][0]
+        self.assertEqual(envelope_arg.message.content, b'{"requestId":"req123","status":"COMPLETE","outputs":{},"associatedTopology":{},"version":"1.0.0"}')
+
+    def test_send_lifecycle_executions_throws_error_when_task_is_none(self):
+        messaging_service = LifecycleMessagingService(postal_service=self.mock_postal_service, topics_configuration=self.mock_topics_configuration)
+        with self.assertRaises(ValueError) as context:
+            messaging_service.send_lifecycle_executions([LifecycleExecution('req1', 'COMPLETE', None), None])
+        self.assertEqual(str(context.exception), 'lifecycle_execution must be set to send an lifecycle execution event')
+        self.mock_postal_service.post_many.assert_not_called()
 
     def test_send_lifecycle_execution_throws_error_when_task_is_none(self):
         messaging_service = LifecycleMessagingService(postal_service=self.mock_postal_service, topics_configuration=self.mock_topics_configuration)
@@ -674,15 +951,16 @@ class TestDriverFilesManagerService(unittest.TestCase):
 
     def setUp(self):
         self.tmp_workspace = tempfile.mkdtemp()
-        self.mock_resource_driver_config = MagicMock(scripts_workspace=self.tmp_workspace)
+        self.mock_resource_driver_config = MagicMock(scripts_workspace=self.tmp_workspace, driver_files_cache_ttl=300, driver_files_cache_max_size=512 * 1024 * 1024)
 
     def tearDown(self):
-        shutil.rmtree(self.tmp_workspace)
+        # replaced trees are removed on a background thread, which may still be running
+        shutil.rmtree(self.tmp_workspace, ignore_errors=True)
 
     def test_auto_creates_workspace(self):
         workspace = os.path.join(self.tmp_workspace, 'my_workspace')
         self.assertFalse(os.path.exists(workspace))
-        mock_resource_driver_config = MagicMock(scripts_workspace=workspace)
+        mock_resource_driver_config = MagicMock(scripts_workspace=workspace, driver_files_cache_ttl=300, driver_files_cache_max_size=512 * 1024 * 1024)
         service = DriverFilesManagerService(resource_driver_config=mock_resource_driver_config)
         self.assertTrue(os.path.exists(workspace))
 
@@ -713,4 +991,246 @@ class TestDriverFilesManagerService(unittest.TestCase):
         self.assertTrue(os.path.exists(os.path.join(self.tmp_workspace, 'test', 'start.sh')))
         self.assertTrue(os.path.exists(os.path.join(self.tmp_workspace, 'test', 'lib')))
         self.assertTrue(os.path.exists(os.path.join(self.tmp_workspace, 'test', 'lib', 'lib1.sh')))
-        self.assertFalse(os.path.exists(os.path.join(self.tmp_workspace, 'test', 'oldlib', 'stop.sh')))
\ No newline at end of file
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_workspace, 'test', 'oldlib')))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_workspace, 'test', 'oldlib', 'stop.sh')))
+
+    def test_build_tree_keeps_existing_when_package_is_invalid(self):
+        os.mkdir(os.path.join(self.tmp_workspace, 'test'))
+        with open(os.path.join(self.tmp_workspace, 'test', 'start.sh'), 'w') as file:
+            pass
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        with self.assertRaises(ValueError):
+            service.build_tree('test', base64.b64encode(b'not a zip file'))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_workspace, 'test', 'start.sh')))
+
+    def test_build_tree_does_not_write_package_to_workspace(self):
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        with open(test_valid_scripts_zip_file, 'rb') as file:
+            file_content = base64.b64encode(file.read())
+        service.build_tree('test', file_content)
+        for _, _, file_names in os.walk(self.tmp_workspace):
+            for file_name in file_names:
+                self.assertFalse(file_name.endswith('.zip'))
+
+    def test_build_tree_throws_error_when_not_a_zip(self):
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        file_content = base64.b64encode(b'not a zip file')
+        with self.assertRaises(ValueError) as context:
+            service.build_tree('test', file_content)
+        self.assertEqual(str(context.exception), 'lifecycle_scripts should include binary contents of a zip file')
+
+    def test_build_tree_accepts_str_content(self):
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        with open(test_valid_scripts_zip_file, 'rb') as file:
+            file_content = base64.b64encode(file.read()).decode('utf-8')
+        service.build_tree('test', file_content)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_workspace, 'test', 'start.sh')))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_workspace, 'test', 'lib', 'lib1.sh')))
+
+    def test_build_tree_extracts_all_files(self):
+        package = io.BytesIO()
+        with zipfile.ZipFile(package, 'w') as package_zip:
+            for dir_idx in range(3):
+                for file_idx in range(20):
+                    package_zip.writestr('dir{0}/nested/file{1}.sh'.format(dir_idx, file_idx), 'content {0} {1}'.format(dir_idx, file_idx))
+            package_zip.writestr('../outside.sh', 'outside')
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        tree = service.build_tree('test', base64.b64encode(package.getvalue()))
+        for dir_idx in range(3):
+            for file_idx in range(20):
+                with open(tree.get_file_path('dir{0}/nested/file{1}.sh'.format(dir_idx, file_idx)), 'r') as file:
+                    self.assertEqual(file.read(), 'content {0} {1}'.format(dir_idx, file_idx))
+        self.assertTrue(tree.has_file('outside.sh'))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_workspace, 'outside.sh')))
+
+    def __build_concurrent_extract_service(self):
+        with patch('ignition.service.resourcedriver.os.cpu_count', return_value=4):
+            service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        self.addCleanup(service._extract_executor.shutdown)
+        min_members_patcher = patch('ignition.service.resourcedriver.DRIVER_FILES_CONCURRENT_EXTRACT_MIN_MEMBERS', 1)
+        min_members_patcher.start()
+        self.addCleanup(min_members_patcher.stop)
+        return service
+
+    def test_build_tree_extracts_all_files_concurrently(self):
+        package = io.BytesIO()
+        with zipfile.ZipFile(package, 'w') as package_zip:
+            for dir_idx in range(3):
+                for file_idx in range(20):
+                    package_zip.writestr('dir{0}/nested/file{1}.sh'.format(dir_idx, file_idx), 'content {0} {1}'.format(dir_idx, file_idx))
+        service = self.__build_concurrent_extract_service()
+        with patch.object(service._extract_executor, 'submit', wraps=service._extract_executor.submit) as mock_submit:
+            tree = service.build_tree('test', base64.b64encode(package.getvalue()))
+        self.assertEqual(mock_submit.call_count, 57)
+        for dir_idx in range(3):
+            for file_idx in range(20):
+                with open(tree.get_file_path('dir{0}/nested/file{1}.sh'.format(dir_idx, file_idx)), 'r') as file:
+                    self.assertEqual(file.read(), 'content {0} {1}'.format(dir_idx, file_idx))
+
+    def test_build_tree_waits_for_all_concurrent_extracts_when_one_fails(self):
+        package = io.BytesIO()
+        with zipfile.ZipFile(package, 'w') as package_zip:
+            for file_idx in range(10):
+                package_zip.writestr('lib/file{0}.sh'.format(file_idx), 'content')
+        service = self.__build_concurrent_extract_service()
+        real_extract = zipfile.ZipFile.extract
+        extracted = []
+        def extract(package_zip, member, path=None, pwd=None):
+            if member.filename == 'lib/file1.sh':
+                raise OSError('Failed to write file1.sh')
+            if member.filename != 'lib/file0.sh':
+                time.sleep(0.05)
+            result = real_extract(package_zip, member, path, pwd)
+            extracted.append(member.filename)
+            return result
+        with patch.object(zipfile.ZipFile, 'extract', new=extract):
+            with self.assertRaises(OSError) as context:
+                service.build_tree('test', base64.b64encode(package.getvalue()))
+        self.assertEqual(str(context.exception), 'Failed to write file1.sh')
+        self.assertEqual(len(extracted), 9)
+
+    def __read_valid_scripts(self):
+        with open(test_valid_scripts_zip_file, 'rb') as file:
+            return base64.b64encode(file.read())
+
+    def test_build_tree_extracts_identical_driver_files_once(self):
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        file_content = self.__read_valid_scripts()
+        with patch('ignition.service.resourcedriver.zipfile.ZipFile', wraps=zipfile.ZipFile) as mock_zip_file:
+            tree_a = service.build_tree('test_a', file_content)
+            tree_b = service.build_tree('test_b', file_content)
+        mock_zip_file.assert_called_once()
+        self.assertNotEqual(tree_a.get_path(), tree_b.get_path())
+        self.assertEqual(len(os.listdir(service.cache_path)), 1)
+
+    def test_build_tree_changing_tree_does_not_affect_other_trees(self):
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        file_content = self.__read_valid_scripts()
+        tree_a = service.build_tree('test_a', file_content)
+        with open(tree_a.get_file_path('start.sh'), 'r') as file:
+            original_content = file.read()
+        with open(tree_a.get_file_path('start.sh'), 'w') as file:
+            file.write('changed by request a')
+        os.chmod(tree_a.get_file_path('start.sh'), 0o600)
+        tree_b = service.build_tree('test_b', file_content)
+        with open(tree_b.get_file_path('start.sh'), 'r') as file:
+            self.assertEqual(file.read(), original_content)
+        self.assertNotEqual(os.stat(tree_b.get_file_path('start.sh')).st_mode & 0o777, 0o600)
+
+    def test_build_tree_does_not_remove_cache_of_other_service(self):
+        file_content = self.__read_valid_scripts()
+        service_a = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        service_a.build_tree('test_a', file_content)
+        service_b = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        service_b.build_tree('test_b', file_content)
+        self.assertNotEqual(service_a.cache_path, service_b.cache_path)
+        with patch('ignition.service.resourcedriver.zipfile.ZipFile', wraps=zipfile.ZipFile) as mock_zip_file:
+            tree_c = service_a.build_tree('test_c', file_content)
+        mock_zip_file.assert_not_called()
+        self.assertTrue(tree_c.has_file('lib/lib1.sh'))
+
+    def test_init_removes_cache_of_stopped_services(self):
+        other_service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        os.makedirs(os.path.join(other_service.cache_path, 'driver'))
+        # a service of another process, such as a replica sharing the workspace (which may have the same pid), holds the lock on its cache
+        running_cache = os.path.join(self.tmp_workspace, '.driver_files_cache.running')
+        os.makedirs(os.path.join(running_cache, 'driver'))
+        running_lock_file = open(running_cache + '.lock', 'a+')
+        self.addCleanup(running_lock_file.close)
+        self.assertTrue(_try_lock_file(running_lock_file))
+        stopped_cache = os.path.join(self.tmp_workspace, '.driver_files_cache.stopped')
+        os.makedirs(os.path.join(stopped_cache, 'driver'))
+        open(stopped_cache + '.lock', 'a+').close()
+        DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        deadline = time.monotonic() + 5
+        while os.path.exists(stopped_cache) or os.path.exists(stopped_cache + '.lock'):
+            if time.monotonic() > deadline:
+                self.fail('Cache of stopped service not removed')
+            time.sleep(0.01)
+        self.assertTrue(os.path.exists(os.path.join(other_service.cache_path, 'driver')))
+        self.assertTrue(os.path.exists(other_service.cache_lock_path))
+        self.assertTrue(os.path.exists(os.path.join(running_cache, 'driver')))
+        self.assertTrue(os.path.exists(running_cache + '.lock'))
+
+    def test_build_tree_extracts_again_when_cached_driver_files_removed(self):
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        file_content = self.__read_valid_scripts()
+        service.build_tree('test_a', file_content)
+        shutil.rmtree(service.cache_path)
+        tree_b = service.build_tree('test_b', file_content)
+        self.assertTrue(tree_b.has_file('lib/lib1.sh'))
+        with patch('ignition.service.resourcedriver.zipfile.ZipFile', wraps=zipfile.ZipFile) as mock_zip_file:
+            tree_c = service.build_tree('test_c', file_content)
+        mock_zip_file.assert_called_once()
+        self.assertTrue(tree_c.has_file('lib/lib1.sh'))
+
+    def test_build_tree_concurrent_identical_driver_files_extracted_once(self):
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        file_content = self.__read_valid_scripts()
+        with patch('ignition.service.resourcedriver.zipfile.ZipFile', wraps=zipfile.ZipFile) as mock_zip_file:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                trees = list(executor.map(lambda idx: service.build_tree('test_{0}'.format(idx), file_content), range(4)))
+        mock_zip_file.assert_called_once()
+        for tree in trees:
+            self.assertTrue(tree.has_file('lib/lib1.sh'))
+
+    def test_build_tree_removing_tree_does_not_affect_cache(self):
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        file_content = self.__read_valid_scripts()
+        tree_a = service.build_tree('test_a', file_content)
+        tree_a.remove_all()
+        tree_b = service.build_tree('test_b', file_content)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_workspace, 'test_a')))
+        self.assertTrue(tree_b.has_file('start.sh'))
+        self.assertTrue(tree_b.has_file('lib/lib1.sh'))
+
+    def test_build_tree_does_not_cache_invalid_driver_files(self):
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                service.build_tree('test', base64.b64encode(b'not a zip file'))
+        self.assertEqual(os.listdir(self.tmp_workspace), [os.path.basename(service.cache_lock_path)])
+
+    def test_build_tree_evicts_expired_driver_files(self):
+        self.mock_resource_driver_config.driver_files_cache_ttl = 0.01
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        file_content = self.__read_valid_scripts()
+        service.build_tree('test_a', file_content)
+        time.sleep(0.02)
+        with patch('ignition.service.resourcedriver.zipfile.ZipFile', wraps=zipfile.ZipFile) as mock_zip_file:
+            tree_b = service.build_tree('test_b', file_content)
+        mock_zip_file.assert_called_once()
+        self.assertTrue(tree_b.has_file('start.sh'))
+
+    def test_expired_driver_files_removed_without_another_request(self):
+        self.mock_resource_driver_config.driver_files_cache_ttl = 0.01
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        service.build_tree('test', self.__read_valid_scripts())
+        deadline = time.monotonic() + 5
+        while len(os.listdir(service.cache_path)) > 0:
+            if time.monotonic() > deadline:
+                self.fail('Expired driver files not removed')
+            time.sleep(0.01)
+
+    def test_build_tree_evicts_least_recently_used_driver_files_over_max_size(self):
+        self.mock_resource_driver_config.driver_files_cache_max_size = 1
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        file_content_a = self.__read_valid_scripts()
+        package = io.BytesIO()
+        with zipfile.ZipFile(package, 'w') as package_zip:
+            package_zip.writestr('other.sh', 'other')
+        file_content_b = base64.b64encode(package.getvalue())
+        service.build_tree('test_a', file_content_a)
+        service.build_tree('test_b', file_content_b)
+        with patch('ignition.service.resourcedriver.zipfile.ZipFile', wraps=zipfile.ZipFile) as mock_zip_file:
+            tree_c = service.build_tree('test_c', file_content_a)
+        mock_zip_file.assert_called_once()
+        self.assertTrue(tree_c.has_file('start.sh'))
+        self.assertTrue(service.build_tree('test_d', file_content_b).has_file('other.sh'))
+
+    def test_build_tree_with_cache_disabled(self):
+        self.mock_resource_driver_config.driver_files_cache_ttl = 0
+        service = DriverFilesManagerService(resource_driver_config=self.mock_resource_driver_config)
+        tree = service.build_tree('test', self.__read_valid_scripts())
+        self.assertTrue(tree.has_file('lib/lib1.sh'))
+        self.assertEqual(os.listdir(self.tmp_workspace), ['test'])
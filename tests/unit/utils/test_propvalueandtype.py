@@ -261,3 +261,88 @@ class TestPropValueAndType(unittest.TestCase):
         for k, v in values.items():
             self.assertEqual(k, 'prop1')
             self.assertEqual(v, None)
+
+    def test_constructor_wraps_source_without_copying(self):
+        source = {
+            'prop1': {
+                'value': 'value1',
+                'type': 'string'
+            }
+        }
+        values = PropValueMap(source)
+        self.assertIs(values.values, source)
+        values['prop2'] = 'value2'
+        self.assertEqual(source['prop2'], {'value': 'value2', 'type': 'string'})
+
+    def test_to_dict_normalises_values(self):
+        values = PropValueMap({
+            'prop1': 'value1',
+            'prop2': {
+                'type': 'string'
+            },
+            'prop3': {
+                'privateKey': 'privKey',
+                'type': 'key'
+            }
+        })
+        expected = {
+            'prop1': {
+                'value': 'value1',
+                'type': 'string'
+            },
+            'prop2': {
+                'value': None,
+                'type': 'string'
+            },
+            'prop3': {
+                'privateKey': 'privKey',
+                'value': None,
+                'type': 'key'
+            }
+        }
+        self.assertEqual(values.to_dict(), expected)
+        self.assertEqual(values.get_value_and_type('prop2'), expected['prop2'])
+
+    def test_constructor_without_values_not_shared(self):
+        values = PropValueMap()
+        values['prop1'] = 'value1'
+        self.assertEqual(len(PropValueMap()), 0)
+
+    def test_plain_values_resolved_lazily(self):
+        values = PropValueMap({
+            'prop1': 'value1',
+            'prop2': {
+                'privateKey': 'privKey',
+                'type': 'key'
+            }
+        })
+        self.assertEqual(values['prop1'], 'value1')
+        self.assertEqual(values.get_value_and_type('prop1'), {'value': 'value1', 'type': 'string'})
+        self.assertEqual(values.get_props(), PropValueMap({
+            'prop1': 'value1',
+            'prop2': {
+                'privateKey': OBFUSCATED_VALUE,
+                'type': 'key'
+            }
+        }))
+
+    def test_get_all(self):
+        values = PropValueMap({
+            'prop1': {
+                'value': 'value1',
+                'type': 'string'
+            },
+            'prop2': {
+                'privateKey': 'privKey',
+                'publicKey': 'pubKey',
+                'type': 'key'
+            },
+            'prop3': {
+                'type': 'string'
+            }
+        })
+        self.assertEqual(values.get_all(), {
+            'prop1': 'value1',
+            'prop2': 'privKey\n---\npubKey',
+            'prop3': None
+        })